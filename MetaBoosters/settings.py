@@ -10,6 +10,8 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/5.2/ref/settings/
 """
 
+import copy
+import os
 from pathlib import Path
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
@@ -37,11 +39,16 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "app",
 ]
 
 MIDDLEWARE = [
+    "app.middleware.ProfilingMiddleware",
+    "app.middleware.QueryBudgetMiddleware",
     "django.middleware.security.SecurityMiddleware",
+    "app.middleware.StaticFilesMiddleware",
+    "app.middleware.ReplicaMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -83,9 +90,50 @@ DATABASES = {
         'PASSWORD': 'metabotpass',
         'HOST': 'localhost',
         'PORT': '5432',
+        # соединение проверяется при выдаче из пула (ConnectionPool.check_connection)
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {},
     }
 }
 
+# Пул соединений psycopg 3 вместо нового соединения на каждый запрос.
+# Включается DATABASE_POOL=1 в окружении и требует psycopg 3 с пакетом
+# psycopg_pool (pip install "psycopg[pool]"); с psycopg2 оставьте выключенным.
+# Размеры — на процесс. Статистика: /metrics/db-pool/, сравнение: manage.py bench_pool
+DATABASE_POOL = os.environ.get("DATABASE_POOL", "0") == "1"
+DATABASE_POOL_MIN_SIZE = 2
+DATABASE_POOL_MAX_SIZE = 10
+DATABASE_POOL_TIMEOUT = 5          # секунды ожидания свободного соединения
+DATABASE_POOL_MAX_WAITING = 50     # очередь длиннее — сразу ошибка, а не зависание
+if DATABASE_POOL:
+    DATABASES["default"]["OPTIONS"]["pool"] = {
+        "min_size": DATABASE_POOL_MIN_SIZE,
+        "max_size": DATABASE_POOL_MAX_SIZE,
+        "timeout": DATABASE_POOL_TIMEOUT,
+        "max_waiting": DATABASE_POOL_MAX_WAITING,
+    }
+
+# Реплики только для чтения: DATABASE_REPLICAS="replica1:5432,replica2"
+# (остальные параметры подключения — как у default). GET/HEAD-запросы и
+# сайдбар тегов читают с реплик, см. app/db.py и app/middleware.py
+for _i, _address in enumerate(filter(None, os.environ.get("DATABASE_REPLICAS", "").split(",")), 1):
+    _host, _, _port = _address.strip().partition(":")
+    # deepcopy: у каждого алиаса свой OPTIONS (и pool), а не общий словарь
+    DATABASES[f"replica_{_i}"] = {
+        **copy.deepcopy(DATABASES["default"]),
+        "HOST": _host,
+        "PORT": _port or DATABASES["default"]["PORT"],
+        "TEST": {"MIRROR": "default"},
+    }
+
+DATABASE_ROUTERS = ["app.db.ReplicaRouter"]
+REPLICA_STICKY_SECONDS = 10       # столько после записи пользователь читает с primary
+REPLICA_MAX_LAG_SECONDS = 10      # реплика с большим отставанием выводится из ротации
+REPLICA_LAG_CHECK_INTERVAL = 5    # как часто (секунды) процесс перепроверяет отставание
+
+# Доступ к /metrics/* без входа под staff: заголовок "Authorization: Bearer <токен>"
+MONITORING_TOKEN = os.environ.get("MONITORING_TOKEN", "")
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -125,6 +173,15 @@ STATIC_URL = "static/"
 STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
+# `manage.py collectstatic` кладёт сюда файлы с хешем содержимого в имени
+# и их .gz/.br-варианты (app.storage); без DEBUG их отдаёт
+# app.middleware.StaticFilesMiddleware с Cache-Control immutable
+STATIC_ROOT = BASE_DIR / "staticfiles"
+STATIC_MAX_AGE = 60   # секунды кэша для файлов без хеша в имени
+STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "app.storage.CompressedManifestStaticFilesStorage"},
+}
 
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.2/ref/settings/#default-auto-field
@@ -133,4 +190,106 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 
 # Media files (uploads)
 MEDIA_URL = '/media/'
-MEDIA_ROOT = BASE_DIR / 'media'
\ No newline at end of file
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# "Горячие" вопросы: рейтинг хранится в Question.hot_score,
+# после изменения параметров выполните `manage.py refresh_hot_scores`
+HOT_DECAY_SECONDS = 45000   # столько секунд свежести весят как x10 голосов
+HOT_ANSWER_WEIGHT = 2       # ответ весит как два лайка
+
+# Общий для всех процессов кэш: на нём держатся маркеры ETag, полностраничный
+# кэш, фрагменты и статистика SQL. Нужен Redis (REDIS_URL, пакет redis) или
+# memcached (MEMCACHED_LOCATION, пакет pymemcache): блокировки и счётчики
+# используют атомарные add/incr. LocMemCache — только для runserver и тестов,
+# без DEBUG с ним не запустятся wsgi.py и asgi.py и не пройдёт
+# `manage.py check --deploy` (app.E001, app/checks.py)
+if os.environ.get("REDIS_URL"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.redis.RedisCache",
+            "LOCATION": os.environ["REDIS_URL"],
+        }
+    }
+elif os.environ.get("MEMCACHED_LOCATION"):
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.memcached.PyMemcacheCache",
+            "LOCATION": os.environ["MEMCACHED_LOCATION"].split(","),
+        }
+    }
+else:
+    CACHES = {
+        "default": {
+            "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        }
+    }
+
+# Сайдбар популярных тегов: топ-N держится в памяти процесса
+# и в общем кэше (CACHES["default"]), см. app/tags.py
+POPULAR_TAGS_LIMIT = 10
+POPULAR_TAGS_TTL = 60         # секунды, общий кэш
+POPULAR_TAGS_LOCAL_TTL = 5    # секунды, память процесса
+
+# Кэш фрагментов (карточки вопросов и ответы), ключ включает version объекта
+FRAGMENT_CACHE_TTL = 60 * 60 * 24
+FRAGMENT_CACHE_STATS_FLUSH = 100  # через сколько обращений сбрасывать счётчики в кэш
+
+# Миниатюры аватаров: строятся в пуле потоков после сохранения профиля
+# и лежат рядом с оригиналом (avatars/x.96.webp, avatars/x.96.jpeg, ...)
+AVATAR_THUMBNAIL_SIZES = (96, 192)   # 1x и 2x для карточек 96×96
+AVATAR_THUMBNAIL_WORKERS = 2
+
+# Лайки: счётчики копятся в памяти процесса и сбрасываются в базу
+# одним UPDATE на объект раз в столько секунд (app/likes.py)
+LIKE_FLUSH_INTERVAL = 2
+
+# Бюджет SQL-запросов на страницу (url_name -> максимум). В DEBUG превышение
+# и повторяющиеся формы запросов пишутся в лог, а ответ получает заголовок
+# Server-Timing; в тестах бюджет проверяет app.testing.QueryBudgetMixin
+# (app/tests.py). Значения — замер на холодном кэше под залогиненным
+# пользователем: сессия и пользователь (2) + лента/вопрос, теги карточек и сайдбар
+QUERY_BUDGETS = {
+    "index": 5,
+    "hot": 5,
+    "tag": 6,
+    "question_detail": 6,
+}
+QUERY_REPEAT_THRESHOLD = 5   # столько одинаковых по форме запросов — вероятный N+1
+
+# Полностраничный кэш для анонимов (app/microcache.py): страница свежая
+# MICROCACHE_TTL секунд, затем ещё MICROCACHE_STALE секунд отдаётся старая
+# копия, пока один воркер собирает новую. Новый вопрос или ответ сбрасывает ленты
+MICROCACHE_TTL = 1
+MICROCACHE_STALE = 10
+MICROCACHE_LOCK_TIMEOUT = 5   # секунды; столько максимум ждут первую сборку страницы
+
+# Условные GET (app/conditional.py): ленты и страницы вопросов отдают ETag и
+# Last-Modified по маркерам изменений в кэше и отвечают 304 без запросов к базе.
+# Столько секунд после записи валидаторы не выдаются — страница могла быть
+# собрана из устаревших копий: сайдбар тегов из памяти процесса, microcache
+# в окне устаревания, отстающая реплика
+CONDITIONAL_SETTLE_SECONDS = max(POPULAR_TAGS_LOCAL_TTL, MICROCACHE_TTL + MICROCACHE_STALE) + (
+    REPLICA_MAX_LAG_SECONDS if len(DATABASES) > 1 else 0
+)
+# Маркер живёт ограниченное время: даже если запись не дошла до кэша
+# (сбой, чужой кэш), устаревший 304 отдаётся не дольше этого
+CONDITIONAL_MARKER_TTL = 600
+
+# Семплирующий профилировщик (app/profiling.py): выключен, пока не задан
+# PROFILE_DIR, и работает только под WSGI. Профилируется доля PROFILE_SAMPLE_RATE
+# запросов и запросы с заголовком X-Profile: <manage.py profile_token>;
+# объединение — merge_profiles
+PROFILE_DIR = os.environ.get("PROFILE_DIR") or None
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_INTERVAL = 0.005       # секунды между снимками стеков
+PROFILE_TOKEN_MAX_AGE = 3600   # столько секунд действителен токен X-Profile
+
+# Статистика SQL по формам запросов в production (app/querystats.py), включается
+# QUERY_STATS=1 в окружении: каждый процесс копит число, время и строки и раз в
+# QUERY_STATS_FLUSH_INTERVAL секунд пишет их в общий кэш (CACHES) окнами по
+# QUERY_STATS_BUCKET секунд. Смотреть — `manage.py top_queries`
+QUERY_STATS = os.environ.get("QUERY_STATS", "0") == "1"
+QUERY_STATS_FLUSH_INTERVAL = 10
+QUERY_STATS_BUCKET = 300
+QUERY_STATS_RETENTION = 24 * 3600   # столько хранятся окна в кэше
+QUERY_STATS_MAX_SHAPES = 500        # форм на процесс, остальные — в "<прочие формы>"
@@ -14,3 +14,7 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "MetaBoosters.settings")
 
 application = get_wsgi_application()
+
+from app.checks import require_shared_cache  # noqa: E402
+
+require_shared_cache()
@@ -0,0 +1,12 @@
+from django.apps import AppConfig
+
+
+class AppConfig(AppConfig):
+    default_auto_field = "django.db.models.BigAutoField"
+    name = "app"
+
+    def ready(self):
+        from . import checks, querylog, querystats, signals  # noqa: F401
+
+        querylog.install()
+        querystats.install()
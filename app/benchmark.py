@@ -0,0 +1,56 @@
+import io
+import math
+import time
+
+from django.conf import settings
+
+
+def default_host():
+    hosts = [h for h in settings.ALLOWED_HOSTS if h != "*" and not h.startswith(".")]
+    return hosts[0] if hosts else "localhost"
+
+
+def wsgi_get(handler, path, host, cookies=None):
+    """
+    GET через WSGIHandler — как от настоящего сервера: в отличие от тестового
+    Client срабатывают request_started/request_finished, и соединение с базой
+    закрывается (или возвращается в пул) после каждого запроса.
+    Возвращает (статус, время в секундах, ответ).
+    """
+    path, _, query = path.partition("?")
+    environ = {
+        "REQUEST_METHOD": "GET",
+        "PATH_INFO": path,
+        "QUERY_STRING": query,
+        "SERVER_NAME": host,
+        "SERVER_PORT": "80",
+        "HTTP_HOST": host,
+        "SERVER_PROTOCOL": "HTTP/1.1",
+        "wsgi.input": io.BytesIO(),
+        "wsgi.errors": io.StringIO(),
+        "wsgi.url_scheme": "http",
+        "wsgi.version": (1, 0),
+        "wsgi.multithread": True,
+        "wsgi.multiprocess": False,
+        "wsgi.run_once": False,
+    }
+    if cookies:
+        environ["HTTP_COOKIE"] = "; ".join(f"{k}={v}" for k, v in cookies.items())
+
+    status = []
+    started = time.perf_counter()
+    response = handler(environ, lambda s, headers, exc_info=None: status.append(s))
+    try:
+        for _ in response:
+            pass
+    finally:
+        response.close()
+    return int(status[0].split()[0]), time.perf_counter() - started, response
+
+
+def percentile(values, p):
+    if not values:
+        return 0.0
+    # nearest-rank
+    values = sorted(values)
+    return values[max(0, math.ceil(p / 100 * len(values)) - 1)]
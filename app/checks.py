@@ -0,0 +1,43 @@
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.memcached import PyLibMCCache, PyMemcacheCache
+from django.core.cache.backends.redis import RedisCache
+from django.core.checks import Error, Tags, register
+from django.core.exceptions import ImproperlyConfigured
+
+# Маркеры ETag (app/conditional.py), полностраничный кэш (app/microcache.py) и
+# статистика SQL (app/querystats.py) рассчитаны на кэш, общий для всех
+# процессов и с атомарными add/incr: блокировка пересборки страницы —
+# cache.add, поколение сброса — cache.incr. LocMemCache у каждого процесса свой,
+# FileBasedCache и DatabaseCache делают add/incr чтением и записью, а файловый
+# ещё и вычищает случайную треть ключей при переполнении.
+SHARED_CACHE_BACKENDS = (RedisCache, PyMemcacheCache, PyLibMCCache)
+
+
+def shared_cache(alias="default"):
+    return isinstance(caches[alias], SHARED_CACHE_BACKENDS)
+
+
+# только в --deploy: тесты идут с DEBUG=False и кэшем в памяти процесса;
+# сам воркер без общего кэша не стартует — см. require_shared_cache
+@register(Tags.caches, deploy=True)
+def check_shared_cache(app_configs=None, **kwargs):
+    # runserver — один процесс, LocMemCache в нём атомарен под блокировкой
+    if settings.DEBUG or shared_cache():
+        return []
+    backend = settings.CACHES["default"]["BACKEND"]
+    return [
+        Error(
+            f"Кэш по умолчанию ({backend}) не общий для процессов или не атомарный",
+            hint="Задайте REDIS_URL или MEMCACHED_LOCATION в окружении (см. CACHES в settings)",
+            obj="CACHES",
+            id="app.E001",
+        )
+    ]
+
+
+def require_shared_cache():
+    # вызывается из wsgi.py и asgi.py: без общего кэша воркер не запускается
+    errors = [e for e in check_shared_cache() if e.id not in settings.SILENCED_SYSTEM_CHECKS]
+    if errors:
+        raise ImproperlyConfigured(f"{errors[0].msg}. {errors[0].hint}")
@@ -0,0 +1,147 @@
+import time
+from datetime import datetime, timezone
+from functools import wraps
+from hashlib import md5
+
+from asgiref.sync import iscoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from .db import replica_aliases
+
+# Маркеры изменений для условных GET (ETag / Last-Modified). Хранятся в общем
+# кэше и обновляются при записи (app/signals.py, app/likes.py, app/thumbnails.py),
+# поэтому валидатор считается без запросов к базе:
+#   site            — видно на всех страницах: сайдбар тегов, профили и аватары
+#   feeds           — карточки лент: новые вопросы, счётчики лайков и ответов
+#   question:<id>   — страница вопроса: ответы и их лайки
+# Если маркер вытеснен из кэша или истёк (CONDITIONAL_MARKER_TTL), он создаётся
+# заново с текущим временем — клиент один раз получит полный ответ. Кэш должен
+# быть общим для процессов (проверка app.E001 в app/checks.py), иначе запись в
+# одном воркере не меняет маркеры других; TTL ограничивает и такую устарелость.
+# Сразу после записи страница ещё может быть собрана из устаревших копий:
+# сайдбар тегов из памяти процесса (POPULAR_TAGS_LOCAL_TTL), запись microcache
+# в окне устаревания (MICROCACHE_TTL + MICROCACHE_STALE), отстающая реплика.
+# ETag на такое тело отдавал бы 304 до следующей записи, поэтому первые
+# CONDITIONAL_SETTLE_SECONDS секунд после записи валидаторы не выдаются.
+
+SITE = "site"
+FEEDS = "feeds"
+
+
+def question_scope(question_id):
+    return f"question:{question_id}"
+
+
+def _key(scope):
+    return f"modified:{scope}"
+
+
+def _ttl():
+    return getattr(settings, "CONDITIONAL_MARKER_TTL", 600)
+
+
+def touch(*scopes):
+    now = time.time()
+    cache.set_many({_key(scope): now for scope in scopes}, _ttl())
+
+
+def markers(*scopes):
+    keys = [_key(scope) for scope in scopes]
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        now = time.time()
+        for key in missing:
+            cache.add(key, now, _ttl())
+        found.update(cache.get_many(missing))
+    return [found.get(key, time.time()) for key in keys]
+
+
+def _session_hash(request):
+    # страница залогиненного пользователя отличается (имя, формы) — сессия
+    # входит в ETag; хешируется только cookie, сама сессия не читается
+    session = request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+    if not session:
+        return "anon"
+    return md5(session.encode(), usedforsecurity=False).hexdigest()[:12]
+
+
+def _settle_seconds():
+    window = getattr(settings, "CONDITIONAL_SETTLE_SECONDS", None)
+    if window is not None:
+        return window
+    window = max(
+        getattr(settings, "POPULAR_TAGS_LOCAL_TTL", 5),
+        getattr(settings, "MICROCACHE_TTL", 1) + getattr(settings, "MICROCACHE_STALE", 10),
+    )
+    if replica_aliases():
+        window += getattr(settings, "REPLICA_MAX_LAG_SECONDS", 10)
+    return window
+
+
+def _settled(values):
+    return time.time() - max(values) >= _settle_seconds()
+
+
+def _etag(request, values):
+    if not _settled(values):
+        return None
+    raw = ":".join([request.get_full_path(), _session_hash(request), *(repr(v) for v in values)])
+    return f'W/"{md5(raw.encode(), usedforsecurity=False).hexdigest()}"'
+
+
+def _last_modified(values):
+    if not _settled(values):
+        return None
+    return datetime.fromtimestamp(max(values), tz=timezone.utc)
+
+
+def feed_etag(request, *args, **kwargs):
+    return _etag(request, markers(SITE, FEEDS))
+
+
+def feed_last_modified(request, *args, **kwargs):
+    return _last_modified(markers(SITE, FEEDS))
+
+
+def question_etag(request, question_id, **kwargs):
+    return _etag(request, markers(SITE, question_scope(question_id)))
+
+
+def question_last_modified(request, question_id, **kwargs):
+    return _last_modified(markers(SITE, question_scope(question_id)))
+
+
+def _private(request, response):
+    # без Last-Modified браузер не кэшировал страницу вовсе; с ним включилась
+    # бы эвристическая свежесть — no-cache требует перепроверки каждый раз
+    if settings.SESSION_COOKIE_NAME in request.COOKIES:
+        patch_cache_control(response, no_cache=True, private=True)
+    else:
+        patch_cache_control(response, no_cache=True)
+    patch_vary_headers(response, ("Cookie",))
+    return response
+
+
+def conditional_page(etag_func, last_modified_func):
+    """
+    condition() для страниц: 304 отдаётся до microcache и до запросов
+    представления, ответ помечается no-cache (и private для сессии).
+    """
+
+    def decorator(view):
+        view = condition(etag_func=etag_func, last_modified_func=last_modified_func)(view)
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                return _private(request, await view(request, *args, **kwargs))
+        else:
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                return _private(request, view(request, *args, **kwargs))
+        return wrapper
+
+    return decorator
@@ -1,6 +1,7 @@
-from app.models import Tag
-from django.db.models import Count
+from django.utils.functional import SimpleLazyObject
+
+from app.tags import get_popular_tags
 
 def popular_tags(request):
-    tags = Tag.objects.annotate(num_questions=Count('questions')).order_by('-num_questions')[:10]
-    return {'popular_tags': tags}
+    # топ тегов читается только если шаблон действительно выводит сайдбар
+    return {'popular_tags': SimpleLazyObject(get_popular_tags)}
@@ -0,0 +1,41 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+
+from .models import Question, Tag, hot_score_expression
+from .tags import invalidate_popular_tags
+
+# Денормализованные счётчики (лайки, ответы, вопросы тега). Обновления идут
+# через F(), поэтому параллельные запросы не теряют инкременты; вызывать
+# внутри транзакции записи — счётчик меняется вместе со строкой. Вместе со
+# счётчиком растёт version — ключ кэша фрагментов.
+# Вызывают обработчики сигналов (app/signals.py) и сброс лайков (app/likes.py).
+
+
+def bump(model, pk, field, delta):
+    model.objects.filter(pk=pk).update(**{
+        field: Greatest(F(field) + delta, 0),
+        "version": F("version") + 1,
+    })
+
+
+def bump_question(pk, field, delta):
+    # счётчик и hot_score — одним UPDATE; в SET справа видны старые значения,
+    # поэтому новое значение счётчика передаётся в выражение явно
+    value = Greatest(F(field) + delta, 0)
+    Question.objects.filter(pk=pk).update(**{
+        field: value,
+        "hot_score": hot_score_expression(**{field.removesuffix("_count"): value}),
+        "version": F("version") + 1,
+    })
+
+
+def bump_tags(tags, delta):
+    # Tag.questions_count — порядок сайдбара популярных тегов (app/tags.py)
+    if delta:
+        tags.update(questions_count=Greatest(F("questions_count") + delta, 0))
+        transaction.on_commit(invalidate_popular_tags)
+
+
+def touch_versions(model, pks):
+    model.objects.filter(pk__in=pks).update(version=F("version") + 1)
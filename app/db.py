@@ -0,0 +1,135 @@
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+logger = logging.getLogger(__name__)
+
+# Чтение с реплик включается только там, где это безопасно: в GET/HEAD
+# (ReplicaMiddleware) и для сайдбара тегов (replica_reads). Всё остальное,
+# включая запись и чтение после записи в том же запросе, идёт на primary.
+_replica_reads = ContextVar("replica_reads", default=False)
+_wrote = ContextVar("wrote", default=False)
+
+# модели, которые читаются только с primary: сессия и пользователь нужны
+# сразу после входа/регистрации, отставание реплики тут недопустимо
+PRIMARY_ONLY_APPS = {"sessions", "auth"}
+
+# alias -> (момент проверки, отставание в секундах или None, если недоступна)
+_lag = {}
+_lag_lock = threading.Lock()
+
+
+def replica_aliases():
+    return [alias for alias in settings.DATABASES if alias != DEFAULT_DB_ALIAS]
+
+
+def measure_lag(alias):
+    """Отставание реплики в секундах по pg_last_xact_replay_timestamp()."""
+    with connections[alias].cursor() as cursor:
+        # если всё полученное WAL уже применено, реплика догнала primary,
+        # даже если последняя транзакция была давно
+        cursor.execute(
+            "SELECT CASE"
+            " WHEN NOT pg_is_in_recovery() THEN 0"
+            " WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0"
+            " ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)"
+            " END"
+        )
+        return float(cursor.fetchone()[0])
+
+
+def replica_lag(alias):
+    interval = getattr(settings, "REPLICA_LAG_CHECK_INTERVAL", 5)
+    now = time.monotonic()
+    checked_at, lag = _lag.get(alias, (None, None))
+    if checked_at is not None and now - checked_at < interval:
+        return lag
+    with _lag_lock:
+        checked_at, lag = _lag.get(alias, (None, None))
+        if checked_at is not None and now - checked_at < interval:
+            return lag
+        try:
+            lag = measure_lag(alias)
+        except Exception:
+            logger.warning("Реплика %s недоступна", alias, exc_info=True)
+            connections[alias].close()
+            lag = None
+        _lag[alias] = (now, lag)
+    return lag
+
+
+def healthy_replicas():
+    max_lag = getattr(settings, "REPLICA_MAX_LAG_SECONDS", 10)
+    return [
+        alias for alias in replica_aliases()
+        if (lag := replica_lag(alias)) is not None and lag <= max_lag
+    ]
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+@contextmanager
+def track_writes():
+    # контекст запроса: после первой записи чтение возвращается на primary
+    token = _wrote.set(False)
+    try:
+        yield _wrote
+    finally:
+        _wrote.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get() or _wrote.get():
+            return DEFAULT_DB_ALIAS
+        if model._meta.app_label in PRIMARY_ONLY_APPS:
+            return DEFAULT_DB_ALIAS
+        replicas = healthy_replicas()
+        return random.choice(replicas) if replicas else DEFAULT_DB_ALIAS
+
+    def db_for_write(self, model, **hints):
+        _wrote.set(True)
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # реплики — физические копии primary, объекты с любой из них совместимы
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def pool_stats():
+    """
+    Статистика пулов соединений этого процесса (OPTIONS["pool"]):
+    in_use, idle, waiting, timeouts и сырые счётчики psycopg_pool.
+    """
+    stats = {}
+    for alias in settings.DATABASES:
+        pool = connections[alias].pool if connections[alias].vendor == "postgresql" else None
+        if pool is None or pool.closed:
+            continue
+        raw = pool.get_stats()
+        stats[alias] = {
+            "size": raw.get("pool_size", 0),
+            "in_use": raw.get("pool_size", 0) - raw.get("pool_available", 0),
+            "idle": raw.get("pool_available", 0),
+            "waiting": raw.get("requests_waiting", 0),
+            # getconn() завершился ошибкой: истёк timeout или очередь длиннее max_waiting
+            "timeouts": raw.get("requests_errors", 0),
+            "raw": raw,
+        }
+    return stats
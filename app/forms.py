@@ -3,9 +3,12 @@ from django.contrib.auth.models import User
 from django.contrib.auth import authenticate, password_validation
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
+from django.db import transaction
+from django.db.models import F
 from django.utils.translation import gettext_lazy as _
 
 from .models import Question, Answer, Tag, Profile
+from .tags import invalidate_popular_tags
 
 USERNAME_VALIDATOR = RegexValidator(r"^[A-Za-z0-9_]{3,30}$", _("Используйте 3‑30 символов: латиницу, цифры и подчёркивания"))
 TAG_VALIDATOR = RegexValidator(r"^[\w.\-]{1,32}$", _("Тег может содержать буквы, цифры, '.', '_' и '-' (до 32 символов)"))
@@ -112,10 +115,25 @@ class AskForm(forms.ModelForm):
         question = super().save(commit=False)
         question.author = author
         if commit:
-            question.save()
-            for name in self.cleaned_data["tags"]:
-                tag, _ = Tag.objects.get_or_create(name=name)
-                question.tags.add(tag)
+            # постоянное число запросов при любом числе тегов: вопрос, upsert
+            # тегов одним INSERT ... ON CONFLICT, связи одним INSERT, счётчики
+            # одним UPDATE. Имена отсортированы — строки тегов блокируются в
+            # одном порядке и параллельные вопросы не взаимоблокируются.
+            names = sorted(self.cleaned_data["tags"])
+            with transaction.atomic():
+                question.save()
+                tags = Tag.objects.bulk_create(
+                    [Tag(name=name) for name in names],
+                    update_conflicts=True,
+                    unique_fields=["name"],
+                    update_fields=["name"],
+                )
+                tag_ids = [tag.pk for tag in tags]
+                Question.tags.through.objects.bulk_create(
+                    [Question.tags.through(question=question, tag_id=pk) for pk in tag_ids]
+                )
+                Tag.objects.filter(pk__in=tag_ids).update(questions_count=F("questions_count") + 1)
+            transaction.on_commit(invalidate_popular_tags)
         return question
 
 class AnswerForm(forms.ModelForm):
@@ -0,0 +1,154 @@
+import atexit
+import logging
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, connection, transaction
+
+from .counters import bump, bump_question
+from .microcache import purge_pages
+from .models import Question, Answer, QuestionLike, AnswerLike
+
+logger = logging.getLogger(__name__)
+
+# вид объекта -> (модель лайка, поле связи, модель объекта)
+LIKE_TARGETS = {
+    "question": (QuestionLike, "question", Question),
+    "answer": (AnswerLike, "answer", Answer),
+}
+
+# Отложенные изменения likes_count: (вид, id) -> дельта. Строка лайка
+# пишется сразу, а счётчик популярного вопроса обновляется одним UPDATE
+# раз в LIKE_FLUSH_INTERVAL секунд, а не на каждый клик — запросы не ждут
+# блокировку строки. Буфер свой у каждого процесса; если процесс упал
+# до сброса, счётчик отстанет — его поправит recount_counters.
+_pending = Counter()
+_lock = threading.Lock()
+_flusher = None
+
+
+def _execute(sql, params):
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchone() is not None
+
+
+def set_like(kind, pk, user, liked):
+    """
+    Ставит или снимает лайк. Идемпотентно: повторный лайк упирается
+    в unique_together и ничего не меняет. Возвращает новое значение счётчика;
+    если объекта уже нет — DoesNotExist его модели.
+    """
+    like_model, fk, target_model = LIKE_TARGETS[kind]
+    qn = connection.ops.quote_name
+    table = qn(like_model._meta.db_table)
+    user_column = qn(like_model._meta.get_field("user").column)
+    target_column = qn(like_model._meta.get_field(fk).column)
+
+    # сигналы QuestionLike/AnswerLike тут не срабатывают — счётчик идёт через буфер
+    if liked:
+        try:
+            # savepoint: ошибка FK не должна ломать внешнюю транзакцию
+            with transaction.atomic():
+                changed = _execute(
+                    f"INSERT INTO {table} ({user_column}, {target_column}) VALUES (%s, %s) "
+                    f"ON CONFLICT ({user_column}, {target_column}) DO NOTHING RETURNING 1",
+                    [user.pk, pk],
+                )
+        except IntegrityError:
+            # объект удалили между проверкой во view и вставкой
+            raise target_model.DoesNotExist(f"{kind} {pk} не найден")
+    else:
+        changed = _execute(
+            f"DELETE FROM {table} WHERE {user_column} = %s AND {target_column} = %s RETURNING 1",
+            [user.pk, pk],
+        )
+    if changed:
+        delta = 1 if liked else -1
+        transaction.on_commit(lambda: add_pending(kind, pk, delta))
+    return likes_count(kind, pk)
+
+
+def likes_count(kind, pk):
+    # значение в базе плюс ещё не сброшенная дельта этого процесса
+    model = LIKE_TARGETS[kind][2]
+    stored = model.objects.filter(pk=pk).values_list("likes_count", flat=True).first() or 0
+    with _lock:
+        delta = _pending[kind, pk]
+    return max(stored + delta, 0)
+
+
+def add_pending(kind, pk, delta):
+    with _lock:
+        _pending[kind, pk] += delta
+        if not _pending[kind, pk]:
+            del _pending[kind, pk]
+    _ensure_flusher()
+
+
+def flush_likes():
+    with _lock:
+        batch = {key: delta for key, delta in _pending.items() if delta}
+        _pending.clear()
+    if not batch:
+        return 0
+
+    try:
+        # один UPDATE на объект, в порядке id — параллельные сбросы
+        # из разных процессов блокируют строки в одном порядке
+        with transaction.atomic():
+            for (kind, pk), delta in sorted(batch.items()):
+                if kind == "question":
+                    bump_question(pk, "likes_count", delta)
+                else:
+                    bump(Answer, pk, "likes_count", delta)
+            question_ids = {pk for (kind, pk) in batch if kind == "question"}
+            answer_ids = [pk for (kind, pk) in batch if kind == "answer"]
+            if answer_ids:
+                question_ids.update(Answer.objects.filter(pk__in=answer_ids).values_list("question_id", flat=True))
+            # счётчики видны в лентах и на страницах вопросов: microcache
+            # анонимов и маркеры ETag — после коммита
+            purge_pages(*sorted(question_ids))
+    except Exception:
+        # вернуть дельты в буфер, чтобы не потерять их до следующей попытки
+        with _lock:
+            _pending.update(batch)
+        raise
+    return len(batch)
+
+
+def _flush_loop(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            flush_likes()
+        except Exception:
+            logger.exception("Не удалось сбросить счётчики лайков")
+        finally:
+            close_old_connections()
+
+
+def _ensure_flusher():
+    global _flusher
+    if _flusher is not None:
+        return
+    with _lock:
+        if _flusher is not None:
+            return
+        _flusher = threading.Thread(
+            target=_flush_loop,
+            args=(getattr(settings, "LIKE_FLUSH_INTERVAL", 2),),
+            name="likes-flush",
+            daemon=True,
+        )
+        _flusher.start()
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        flush_likes()
+    except Exception:
+        logger.exception("Не удалось сбросить счётчики лайков при завершении")
@@ -0,0 +1,104 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import cycle, islice
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from app.benchmark import default_host, percentile, wsgi_get
+from app.db import pool_stats
+from app.models import Question
+
+
+class Command(BaseCommand):
+    help = (
+        "Сравнивает запросы в секунду и задержки страниц без пула соединений "
+        "(новое соединение на запрос) и с пулом psycopg. Только PostgreSQL"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--requests", type=int, default=500, help="Запросов на каждый режим")
+        parser.add_argument("--concurrency", type=int, default=8, help="Параллельных потоков")
+        parser.add_argument("--path", action="append", dest="paths", help="Адрес страницы (можно несколько)")
+        parser.add_argument("--host", default=None, help="Заголовок Host (по умолчанию из ALLOWED_HOSTS)")
+
+    def configure(self, pooled, pool_options):
+        # каждый поток создаёт свой DatabaseWrapper из этих же словарей настроек;
+        # у каждого алиаса (default и реплики) свой OPTIONS
+        for alias in connections:
+            connections[alias].close()
+            if connections[alias].vendor != "postgresql":
+                continue
+            connections[alias].close_pool()
+            options = settings.DATABASES[alias].setdefault("OPTIONS", {})
+            if pooled:
+                options["pool"] = dict(pool_options)
+            else:
+                options.pop("pool", None)
+
+    def run(self, handler, paths, host, total, concurrency):
+        def one(path):
+            status, elapsed, _ = wsgi_get(handler, path, host)
+            return status, elapsed
+
+        # прогрев: импорт шаблонов, заполнение пула и кэша фрагментов
+        with ThreadPoolExecutor(concurrency) as executor:
+            list(executor.map(one, islice(cycle(paths), concurrency * 2)))
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as executor:
+            results = list(executor.map(one, islice(cycle(paths), total)))
+        wall = time.perf_counter() - started
+        timings = [elapsed for _, elapsed in results]
+        errors = sum(1 for status, _ in results if status >= 500)
+        return {
+            "rps": total / wall,
+            "p50": percentile(timings, 50) * 1000,
+            "p95": percentile(timings, 95) * 1000,
+            "p99": percentile(timings, 99) * 1000,
+            "errors": errors,
+        }
+
+    def handle(self, *args, **options):
+        if connections["default"].vendor != "postgresql":
+            raise CommandError("Пул соединений поддерживается только для PostgreSQL")
+
+        paths = options["paths"]
+        if not paths:
+            question = Question.objects.order_by("-answers_count").first()
+            paths = ["/", "/hot/"] + ([question.get_absolute_url()] if question else [])
+        host = options["host"] or default_host()
+        pool_options = settings.DATABASES["default"]["OPTIONS"].get("pool") or {
+            "min_size": getattr(settings, "DATABASE_POOL_MIN_SIZE", 2),
+            "max_size": getattr(settings, "DATABASE_POOL_MAX_SIZE", 10),
+            "timeout": getattr(settings, "DATABASE_POOL_TIMEOUT", 5),
+        }
+        handler = WSGIHandler()
+
+        self.stdout.write(
+            f"{options['requests']} запросов, {options['concurrency']} потоков, страницы: {', '.join(paths)}"
+        )
+        results = {}
+        original = settings.DATABASES["default"]["OPTIONS"].get("pool")
+        try:
+            for label, pooled in (("без пула", False), ("с пулом", True)):
+                self.configure(pooled, pool_options)
+                results[label] = self.run(handler, paths, host, options["requests"], options["concurrency"])
+                r = results[label]
+                self.stdout.write(self.style.SUCCESS(
+                    f"{label}: {r['rps']:.1f} запросов/с, p50 {r['p50']:.1f} мс, "
+                    f"p95 {r['p95']:.1f} мс, p99 {r['p99']:.1f} мс, ошибок {r['errors']}"
+                ))
+                if pooled:
+                    for alias, stats in pool_stats().items():
+                        self.stdout.write(
+                            f"  пул {alias}: размер {stats['size']}, занято {stats['in_use']}, "
+                            f"ожидают {stats['waiting']}, таймаутов {stats['timeouts']}"
+                        )
+        finally:
+            self.configure(bool(original), original)
+
+        speedup = results["с пулом"]["rps"] / results["без пула"]["rps"]
+        self.stdout.write(self.style.SUCCESS(f"Пул быстрее в {speedup:.2f} раза"))
@@ -0,0 +1,249 @@
+import io
+import json
+import logging
+import platform
+import random
+import subprocess
+import time
+from collections import Counter
+
+import django
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test import Client, RequestFactory
+from django.urls import reverse
+from django.utils import timezone
+
+from app import urls as app_urls
+from app.benchmark import default_host, percentile
+from app.models import Question, Answer, Tag, QuestionLike, AnswerLike, NEW_KEYS
+from app.querylog import record_queries
+from app.utils import paginate
+
+
+class Scenario:
+    # path(ctx, rng) -> адрес; data(ctx, rng) -> тело POST
+    def __init__(self, url_name, method="GET", auth=("anon", "user"), path=None, data=None, relogin=False):
+        self.url_name = url_name
+        self.method = method
+        self.auth = auth
+        self.path = path or (lambda ctx, rng: reverse(url_name))
+        self.data = data
+        self.relogin = relogin
+
+
+def _question(ctx, rng):
+    return rng.choice(ctx["question_ids"])
+
+
+def _answer(ctx, rng):
+    return rng.choice(ctx["answer_ids"])
+
+
+SCENARIOS = [
+    Scenario("index"),
+    Scenario("index", path=lambda ctx, rng: reverse("index") + f"?cursor={ctx['cursor']}"),
+    Scenario("hot"),
+    Scenario("tag", path=lambda ctx, rng: reverse("tag", args=[rng.choice(ctx["tags"])])),
+    Scenario("search", path=lambda ctx, rng: reverse("search") + "?q=" + rng.choice(["штрафной", "тактика", "игрок"])),
+    Scenario("question_detail", path=lambda ctx, rng: reverse("question_detail", args=[_question(ctx, rng)])),
+    Scenario(
+        "question_detail",
+        path=lambda ctx, rng: reverse("question_detail", args=[ctx["busy_question"]]) + "?page=2",
+    ),
+    Scenario(
+        "question_detail", method="POST", auth=("user",),
+        path=lambda ctx, rng: reverse("question_detail", args=[_question(ctx, rng)]),
+        data=lambda ctx, rng: {"text": f"Ответ из бенчмарка №{rng.randrange(10 ** 6)}"},
+    ),
+    Scenario("ask"),
+    Scenario(
+        "ask", method="POST", auth=("user",),
+        data=lambda ctx, rng: {
+            "title": f"Вопрос из бенчмарка №{rng.randrange(10 ** 6)}",
+            "text": "Текст вопроса из нагрузочного теста, длиннее тридцати символов.",
+            "tags": ", ".join(rng.sample(ctx["tags"], k=2)),
+        },
+    ),
+    Scenario("question_like", method="POST", path=lambda ctx, rng: reverse("question_like", args=[_question(ctx, rng)])),
+    Scenario("question_unlike", method="POST", path=lambda ctx, rng: reverse("question_unlike", args=[_question(ctx, rng)])),
+    Scenario("answer_like", method="POST", path=lambda ctx, rng: reverse("answer_like", args=[_answer(ctx, rng)])),
+    Scenario("answer_unlike", method="POST", path=lambda ctx, rng: reverse("answer_unlike", args=[_answer(ctx, rng)])),
+    Scenario("login", auth=("anon",)),
+    Scenario("signup", auth=("anon",)),
+    Scenario("settings"),
+    Scenario("logout", auth=("user",), relogin=True),
+    Scenario("db_pool_metrics"),
+]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class Command(BaseCommand):
+    help = (
+        "Нагрузочный бенчмарк: для каждого ratio очищает базу, заполняет её fill_db "
+        "и прогоняет все адреса app/urls.py анонимно и под пользователем. "
+        "Печатает p50/p95/p99, запросы в секунду и SQL на запрос, сохраняет JSON. "
+        "ВНИМАНИЕ: данные в базе удаляются"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--ratios", type=int, nargs="+", default=[10, 100], help="Масштабы fill_db")
+        parser.add_argument("--requests", type=int, default=50, help="Запросов на сценарий")
+        parser.add_argument("--warmup", type=int, default=3, help="Запросов прогрева (не учитываются)")
+        parser.add_argument("--seed", type=int, default=42, help="Seed данных и выбора адресов")
+        parser.add_argument("--copy", action="store_true", help="Заполнять базу через COPY")
+        parser.add_argument("--output", default=None, help="Файл для JSON-результатов")
+        parser.add_argument("--compare", default=None, help="JSON прошлого прогона для сравнения")
+        parser.add_argument("--noinput", "--no-input", action="store_false", dest="interactive")
+
+    def handle(self, *args, **options):
+        if options["interactive"]:
+            answer = input("База будет очищена и заполнена заново. Продолжить? [yes/no] ")
+            if answer != "yes":
+                raise CommandError("Отменено")
+        self.check_coverage()
+
+        report = {
+            "commit": _git_commit(),
+            "created": timezone.now().isoformat(),
+            "python": platform.python_version(),
+            "django": django.get_version(),
+            "database": settings.DATABASES["default"]["ENGINE"],
+            "requests": options["requests"],
+            "runs": [],
+        }
+        # 403/404/405 — ожидаемые ответы сценариев, в логе они только мешают
+        request_logger = logging.getLogger("django.request")
+        level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+        try:
+            for ratio in options["ratios"]:
+                report["runs"].append(self.run_ratio(ratio, options))
+        finally:
+            request_logger.setLevel(level)
+
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                json.dump(report, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Результаты сохранены в {options['output']}"))
+        if options["compare"]:
+            self.compare(report, options["compare"])
+
+    def check_coverage(self):
+        names = {p.name for p in app_urls.urlpatterns if p.name}
+        missing = names - {s.url_name for s in SCENARIOS}
+        if missing:
+            self.stdout.write(self.style.WARNING(f"Нет сценариев для: {', '.join(sorted(missing))}"))
+
+    def seed(self, ratio, options):
+        self.stdout.write(self.style.WARNING(f"ratio={ratio}: очистка и заполнение базы..."))
+        call_command("clear_db", truncate=True, stdout=io.StringIO())
+        call_command("fill_db", ratio, seed=options["seed"], copy=options["copy"], stdout=io.StringIO())
+        cache.clear()
+
+        rng = random.Random(options["seed"])
+        question_ids = list(Question.objects.values_list("pk", flat=True))
+        answer_ids = list(Answer.objects.values_list("pk", flat=True))
+        first = paginate(Question.objects.feed_new(), RequestFactory().get("/"), 5, keys=NEW_KEYS)
+        return {
+            "question_ids": rng.sample(question_ids, k=min(200, len(question_ids))),
+            "answer_ids": rng.sample(answer_ids, k=min(200, len(answer_ids))),
+            "busy_question": Question.objects.order_by("-answers_count").values_list("pk", flat=True)[0],
+            "tags": list(Tag.objects.order_by("-questions_count").values_list("name", flat=True)[:10]),
+            "cursor": first.next_cursor or "",
+            "user": User.objects.filter(is_superuser=False).order_by("pk").first(),
+            "rows": {
+                "users": User.objects.count(),
+                "questions": len(question_ids),
+                "answers": len(answer_ids),
+                "likes": QuestionLike.objects.count() + AnswerLike.objects.count(),
+            },
+        }
+
+    def run_ratio(self, ratio, options):
+        ctx = self.seed(ratio, options)
+        rng = random.Random(options["seed"])
+        results = []
+        self.stdout.write(f"{'сценарий':<40} {'p50':>7} {'p95':>7} {'p99':>7} {'req/s':>7} {'SQL':>5}")
+        for scenario in SCENARIOS:
+            for auth in scenario.auth:
+                result = self.run_scenario(scenario, auth, ctx, rng, options)
+                results.append(result)
+                style = self.style.ERROR if result["errors"] else self.style.SUCCESS
+                self.stdout.write(style(
+                    f"{result['name']:<40} {result['p50_ms']:>7.1f} {result['p95_ms']:>7.1f} "
+                    f"{result['p99_ms']:>7.1f} {result['rps']:>7.1f} {result['queries_mean']:>5.1f}"
+                ))
+        return {"ratio": ratio, "rows": ctx["rows"], "scenarios": results}
+
+    def run_scenario(self, scenario, auth, ctx, rng, options):
+        client = Client(HTTP_HOST=default_host(), raise_request_exception=False)
+        if auth == "user":
+            client.force_login(ctx["user"])
+
+        timings, queries, statuses = [], [], Counter()
+        sample_path = None
+        for i in range(options["warmup"] + options["requests"]):
+            if scenario.relogin:
+                client.force_login(ctx["user"])
+            path = scenario.path(ctx, rng)
+            sample_path = sample_path or path
+            data = scenario.data(ctx, rng) if scenario.data else {}
+            request = client.post if scenario.method == "POST" else client.get
+
+            with record_queries() as recorder:
+                started = time.perf_counter()
+                response = request(path, data)
+                elapsed = time.perf_counter() - started
+            if i < options["warmup"]:
+                continue
+            timings.append(elapsed)
+            queries.append(recorder.count)
+            statuses[response.status_code] += 1
+
+        suffix = " ?page=2" if "page=2" in sample_path else " cursor" if "cursor=" in sample_path else ""
+        return {
+            "name": f"{scenario.method} {scenario.url_name}{suffix} [{auth}]",
+            "url_name": scenario.url_name,
+            "method": scenario.method,
+            "auth": auth,
+            "sample_path": sample_path,
+            "p50_ms": percentile(timings, 50) * 1000,
+            "p95_ms": percentile(timings, 95) * 1000,
+            "p99_ms": percentile(timings, 99) * 1000,
+            "rps": len(timings) / sum(timings) if timings else 0.0,
+            "queries_mean": sum(queries) / len(queries) if queries else 0.0,
+            "queries_max": max(queries, default=0),
+            "statuses": {str(k): v for k, v in sorted(statuses.items())},
+            "errors": sum(v for k, v in statuses.items() if k >= 500),
+        }
+
+    def compare(self, report, path):
+        with open(path, encoding="utf-8") as f:
+            previous = json.load(f)
+        self.stdout.write(f"Сравнение с {path} (коммит {previous.get('commit')}):")
+        before = {
+            (run["ratio"], s["name"]): s for run in previous["runs"] for s in run["scenarios"]
+        }
+        for run in report["runs"]:
+            for s in run["scenarios"]:
+                old = before.get((run["ratio"], s["name"]))
+                if old is None:
+                    continue
+                dp95 = (s["p95_ms"] - old["p95_ms"]) / old["p95_ms"] * 100 if old["p95_ms"] else 0.0
+                dq = s["queries_mean"] - old["queries_mean"]
+                line = f"ratio={run['ratio']} {s['name']:<40} p95 {dp95:+6.1f}%  SQL {dq:+.1f}"
+                regressed = dq > 0 or dp95 > 20
+                self.stdout.write(self.style.ERROR(line) if regressed else line)
@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from app.models import Profile
+from app.thumbnails import generate_thumbnails
+
+
+class Command(BaseCommand):
+    help = "Строит недостающие миниатюры аватаров (по одному разу на каждый файл)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--force", action="store_true", help="Перестроить и уже готовые миниатюры")
+
+    def handle(self, *args, **options):
+        profiles = Profile.objects.exclude(avatar="").exclude(avatar__isnull=True)
+        if not options["force"]:
+            profiles = profiles.exclude(thumbnails_for=F("avatar"))
+        names = profiles.order_by().values_list("avatar", flat=True).distinct()
+
+        built = 0
+        for name in names.iterator():
+            try:
+                generate_thumbnails(name, force=options["force"])
+                built += 1
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"{name}: {e}"))
+        self.stdout.write(self.style.SUCCESS(f"Миниатюры построены для {built} файлов"))
@@ -1,11 +1,39 @@
+from django.core.cache import cache
+from django.core.management import call_command
 from django.core.management.base import BaseCommand
+from django.core.management.color import no_style
+from django.db import connection, transaction
 from django.contrib.auth.models import User
 from app.models import Profile, Tag, Question, Answer, QuestionLike, AnswerLike
 
 class Command(BaseCommand):
     help = "Очищает все тестовые данные, кроме суперпользователя"
 
-    def handle(self, *args, **kwargs):
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--truncate", action="store_true",
+            help="Быстрая очистка: TRUNCATE таблиц приложения со сбросом последовательностей",
+        )
+        parser.add_argument(
+            "--purge-avatars", action="store_true",
+            help="Удалить файлы в media/avatars/, на которые не ссылается ни один профиль",
+        )
+
+    def handle(self, *args, **options):
+        if options["truncate"]:
+            self.truncate()
+        else:
+            self.delete()
+
+        # id после очистки переиспользуются — кэш фрагментов и тегов больше не валиден
+        cache.clear()
+
+        if options["purge_avatars"]:
+            self.purge_avatars()
+
+        self.stdout.write(self.style.SUCCESS("База очищена. Суперпользователь сохранён."))
+
+    def delete(self):
         self.stdout.write(self.style.WARNING("Удаление лайков..."))
         QuestionLike.objects.all().delete()
         AnswerLike.objects.all().delete()
@@ -21,4 +49,36 @@ class Command(BaseCommand):
         Profile.objects.all().delete()
         User.objects.filter(is_superuser=False).delete()
 
-        self.stdout.write(self.style.SUCCESS("База очищена. Суперпользователь сохранён."))
+    def truncate(self):
+        models = [QuestionLike, AnswerLike, Answer, Question.tags.through, Question, Tag]
+        tables = [m._meta.db_table for m in models]
+
+        self.stdout.write(self.style.WARNING("TRUNCATE лайков, ответов, вопросов и тегов..."))
+        # на PostgreSQL это один TRUNCATE ... RESTART IDENTITY
+        connection.ops.execute_sql_flush(
+            connection.ops.sql_flush(no_style(), tables, reset_sequences=True)
+        )
+
+        # auth_user целиком не очистить — суперпользователи остаются.
+        # Удаляем обычных пользователей и строки, ссылающиеся на них, прямыми
+        # DELETE без загрузки объектов в Python (каскад Django тут не нужен).
+        self.stdout.write(self.style.WARNING("Удаление профилей и пользователей..."))
+        qn = connection.ops.quote_name
+        users = f"SELECT {qn('id')} FROM {qn(User._meta.db_table)} WHERE NOT {qn('is_superuser')}"
+        references = [
+            (rel.related_model._meta.db_table, rel.field.column)
+            for rel in User._meta.related_objects
+            if not rel.many_to_many and rel.related_model._meta.db_table not in tables
+        ]
+        references += [
+            (f.remote_field.through._meta.db_table, f.m2m_column_name())
+            for f in User._meta.many_to_many
+        ]
+        with transaction.atomic(), connection.cursor() as cursor:
+            for table, column in references:
+                cursor.execute(f"DELETE FROM {qn(table)} WHERE {qn(column)} IN ({users})")
+            cursor.execute(f"DELETE FROM {qn(User._meta.db_table)} WHERE NOT {qn('is_superuser')}")
+
+    def purge_avatars(self):
+        # после очистки профилей новых загрузок нет — ждать min-age не нужно
+        call_command("gc_avatars", min_age=0, stdout=self.stdout)
@@ -1,148 +1,298 @@
 # management/commands/fill_db.py
+import io
 import os
 import random
+from array import array
 
-from django.core.files.base import ContentFile
-from django.core.management.base import BaseCommand
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import User
+from django.core.files.base import ContentFile
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Max
+from django.utils import timezone
 
-from MetaBoosters import settings
 from app.models import Profile, Tag, Question, Answer, QuestionLike, AnswerLike
-from itertools import product
+from app.tags import invalidate_popular_tags
+from app.thumbnails import generate_thumbnails
+
+
+# Тематические шаблоны FIFA
+QUESTION_TITLES = [
+    "Как забить со штрафного в FIFA 24?",
+    "Какая лучшая тактика для раша?",
+    "Какой игрок самый быстрый в FIFA 23?",
+    "Почему вратарь не двигается при пенальти?",
+    "Лучшие связки игроков в составе из АПЛ?",
+    "Стоит ли качать защитников на навесы?",
+    "Как использовать фейковые движения?",
+    "Кто лучший нападающий в FIFA 24?",
+    "Сколько монет нужно для хорошего состава?",
+    "Как лучше всего реализовывать угловые?",
+    "Какие карточки самые метовые?",
+    "Как повысить химию в составе?",
+]
+
+QUESTION_TEXTS = [
+    "Уже неделю играю и не понимаю, как стабильно забивать штрафные. Подскажите!",
+    "Нужен совет по схеме 4-2-3-1. Кто как играет?",
+    "Слышал, что Мбаппе самый быстрый. Это так?",
+    "Иногда вратарь просто замирает на месте. Баг или что-то не так делаю?",
+    "Хочу собрать состав из игроков АПЛ. Кто сейчас в мета?",
+    "Что лучше — длинные навесы или прострелы?",
+    "Кто топовый ЦАП на бюджет до 100к?",
+    "Какие навыки лучше качать для фланговых защитников?",
+    "Как работает динамическая тактика в FIFA?",
+    "Какие стили сыгранности самые эффективные?",
+]
+
+TAG_NAMES = [
+    "штрафные", "тактика", "игроки", "вратари", "АПЛ", "Ultimate Team",
+    "финты", "навыки", "состав", "мета", "карточки", "химия", "угловые", "пенальти"
+]
+
+ANSWER_TEXTS = [
+    "Попробуй зажать R1 при ударе — тогда мяч пойдёт точно в угол.",
+    "Схема 4-3-3 работает лучше, если играешь от флангов.",
+    "Да, Мбаппе и Винисиус самые быстрые на сегодняшний день.",
+    "Это баг в версии 1.04, после обновления должно исправиться.",
+    "В АПЛ сейчас топовые — Холанд, Де Брюйне и Сака.",
+    "Не забудь про тактику давления после потери мяча.",
+    "Химия команды влияет на пас и скорость — стоит прокачивать.",
+    "Лучше не использовать автозащиту — она часто даёт сбои.",
+    "Для пенальти лучше нацеливаться чуть ниже перекладины.",
+    "Подача с углового на ближнюю штангу — почти всегда гол!",
+]
+
+
+class BulkWriter:
+    # вставка пачками через bulk_create, возвращает id созданных строк
+    def __init__(self, model, batch_size):
+        self.model = model
+        self.batch_size = batch_size
+
+    def write(self, rows):
+        objs = self.model.objects.bulk_create(
+            [self.model(**row) for row in rows], batch_size=self.batch_size
+        )
+        return [obj.pk for obj in objs]
+
+    def close(self):
+        pass
+
+
+class CopyWriter:
+    # PostgreSQL COPY FROM STDIN; id выдаются заранее, последовательность
+    # сбрасывается в close()
+    def __init__(self, model, batch_size):
+        self.model = model
+        self.fields = model._meta.concrete_fields
+        self.columns = ", ".join(connection.ops.quote_name(f.column) for f in self.fields)
+        self.table = connection.ops.quote_name(model._meta.db_table)
+        self.next_id = (model.objects.aggregate(m=Max("pk"))["m"] or 0) + 1
+        self.now = timezone.now()
+
+    def _value(self, field, row):
+        if field.attname in row:
+            return row[field.attname]
+        if getattr(field, "auto_now_add", False) or getattr(field, "auto_now", False):
+            return self.now
+        return field.get_default()
+
+    def write(self, rows):
+        ids = list(range(self.next_id, self.next_id + len(rows)))
+        self.next_id += len(rows)
+        records = []
+        for pk, row in zip(ids, rows):
+            row = {**row, self.model._meta.pk.attname: pk}
+            records.append([self._value(f, row) for f in self.fields])
+
+        sql = f"COPY {self.table} ({self.columns}) FROM STDIN"
+        with connection.cursor() as cursor:
+            raw = cursor.cursor
+            if hasattr(raw, "copy"):  # psycopg 3
+                with raw.copy(sql) as copy:
+                    for record in records:
+                        copy.write_row(record)
+            else:  # psycopg2
+                raw.copy_expert(sql, io.StringIO("".join(_copy_line(r) for r in records)))
+        return ids
+
+    def close(self):
+        with connection.cursor() as cursor:
+            for sql in connection.ops.sequence_reset_sql(no_style(), [self.model]):
+                cursor.execute(sql)
+
+
+def _copy_text(value):
+    if value is None:
+        return r"\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n").replace("\r", "\\r")
+
+
+def _copy_line(record):
+    return "\t".join(_copy_text(v) for v in record) + "\n"
 
 
 class Command(BaseCommand):
+    help = (
+        "Заполняет базу тестовыми данными: ratio пользователей, ratio*10 вопросов, "
+        "ratio*100 ответов и ratio*200 лайков. Пишет пачками, память не зависит от ratio"
+    )
 
     def add_arguments(self, parser):
         parser.add_argument('ratio', type=int, help='Multiplier ratio for generated data')
+        parser.add_argument('--seed', type=int, default=None, help='Seed для воспроизводимых данных (на пустой базе)')
+        parser.add_argument('--batch-size', type=int, default=5000, help='Размер пачки вставки')
+        parser.add_argument('--password', default='password', help='Пароль всех созданных пользователей')
+        parser.add_argument(
+            '--copy', action='store_true',
+            help='Быстрая загрузка через COPY (только PostgreSQL)',
+        )
 
     def handle(self, *args, **options):
         ratio: int = options["ratio"]
+        batch_size: int = options["batch_size"]
+        rng = random.Random(options["seed"])
 
-        # Тематические шаблоны FIFA
-        question_titles = [
-            "Как забить со штрафного в FIFA 24?",
-            "Какая лучшая тактика для раша?",
-            "Какой игрок самый быстрый в FIFA 23?",
-            "Почему вратарь не двигается при пенальти?",
-            "Лучшие связки игроков в составе из АПЛ?",
-            "Стоит ли качать защитников на навесы?",
-            "Как использовать фейковые движения?",
-            "Кто лучший нападающий в FIFA 24?",
-            "Сколько монет нужно для хорошего состава?",
-            "Как лучше всего реализовывать угловые?",
-            "Какие карточки самые метовые?",
-            "Как повысить химию в составе?",
-        ]
-
-        question_texts = [
-            "Уже неделю играю и не понимаю, как стабильно забивать штрафные. Подскажите!",
-            "Нужен совет по схеме 4-2-3-1. Кто как играет?",
-            "Слышал, что Мбаппе самый быстрый. Это так?",
-            "Иногда вратарь просто замирает на месте. Баг или что-то не так делаю?",
-            "Хочу собрать состав из игроков АПЛ. Кто сейчас в мета?",
-            "Что лучше — длинные навесы или прострелы?",
-            "Кто топовый ЦАП на бюджет до 100к?",
-            "Какие навыки лучше качать для фланговых защитников?",
-            "Как работает динамическая тактика в FIFA?",
-            "Какие стили сыгранности самые эффективные?",
-        ]
-
-        tag_names = [
-            "штрафные", "тактика", "игроки", "вратари", "АПЛ", "Ultimate Team",
-            "финты", "навыки", "состав", "мета", "карточки", "химия", "угловые", "пенальти"
-        ]
-
-        answer_texts = [
-            "Попробуй зажать R1 при ударе — тогда мяч пойдёт точно в угол.",
-            "Схема 4-3-3 работает лучше, если играешь от флангов.",
-            "Да, Мбаппе и Винисиус самые быстрые на сегодняшний день.",
-            "Это баг в версии 1.04, после обновления должно исправиться.",
-            "В АПЛ сейчас топовые — Холанд, Де Брюйне и Сака.",
-            "Не забудь про тактику давления после потери мяча.",
-            "Химия команды влияет на пас и скорость — стоит прокачивать.",
-            "Лучше не использовать автозащиту — она часто даёт сбои.",
-            "Для пенальти лучше нацеливаться чуть ниже перекладины.",
-            "Подача с углового на ближнюю штангу — почти всегда гол!",
-        ]
-
-        default_avatar_path = os.path.join(
-            settings.BASE_DIR, "static", "img", "some_logo.jpeg"
-        )
-        with open(default_avatar_path, "rb") as f:
-            avatar_bytes = f.read()
+        if ratio < 1:
+            raise CommandError("ratio должен быть положительным")
+        if options["copy"] and connection.vendor != "postgresql":
+            raise CommandError("--copy поддерживается только для PostgreSQL")
+        writer_class = CopyWriter if options["copy"] else BulkWriter
+        writers = {}
 
-        self.stdout.write(self.style.SUCCESS("Создание пользователей и профилей..."))
-        users = []
-        for i in range(ratio):
-            username = f"fifa_user_{i}_{random.randint(1000, 9999)}"
-            email = f"{username}@example.com"
-            password = f"pass{i + 1}"
-            user = User.objects.create_user(username=username, email=email, password=password)
+        def insert(model, rows):
+            if model not in writers:
+                writers[model] = writer_class(model, batch_size)
+            return writers[model].write(rows)
 
-            profile = Profile.objects.create(user=user)
-            avatar_content = ContentFile(avatar_bytes, name="avatar.jpeg")
-            profile.avatar.save("avatar.jpeg", avatar_content, save=True)
+        def batched(rows):
+            batch = []
+            for row in rows:
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+        # один файл аватара на всех; хеш пароля тоже считается один раз
+        default_avatar_path = os.path.join(settings.BASE_DIR, "static", "img", "some_logo.jpeg")
+        with open(default_avatar_path, "rb") as f:
+            avatar_storage = Profile._meta.get_field("avatar").storage
+            avatar_name = avatar_storage.save("avatars/avatar.jpeg", ContentFile(f.read()))
+        generate_thumbnails(avatar_name)
+        password = make_password(options["password"])
 
-            users.append(user)
+        self.stdout.write(self.style.SUCCESS("Создание пользователей и профилей..."))
+        # номера продолжают уже занятые: повторный запуск с тем же --seed
+        # без clear_db не упирается в уникальность username
+        offset = User.objects.aggregate(last=Max("pk"))["last"] or 0
+        user_ids = array("q")
+        users = (
+            {
+                "username": f"fifa_user_{offset + i}_{rng.randint(1000, 9999)}",
+                "email": f"fifa_user_{offset + i}@example.com",
+                "password": password,
+            }
+            for i in range(ratio)
+        )
+        for batch in batched(users):
+            ids = insert(User, batch)
+            user_ids.extend(ids)
+            insert(Profile, [
+                {"user_id": pk, "avatar": avatar_name, "thumbnails_for": avatar_name} for pk in ids
+            ])
 
         self.stdout.write(self.style.SUCCESS("Создание тегов..."))
-        tags = []
-        for idx, name in enumerate(tag_names, 1):
-            tag_name = f"{name}.{idx}"
-            tag, _ = Tag.objects.get_or_create(name=tag_name)
-            tags.append(tag)
+        names = [f"{name}.{idx}" for idx, name in enumerate(TAG_NAMES, 1)]
+        Tag.objects.bulk_create([Tag(name=n) for n in names], ignore_conflicts=True)
+        tag_ids = list(Tag.objects.filter(name__in=names).values_list("pk", flat=True))
 
         self.stdout.write(self.style.SUCCESS("Создание вопросов..."))
-        questions = []
-        for _ in range(ratio * 10):
-            author = random.choice(users)
-            question = Question.objects.create(
-                author=author,
-                title=random.choice(question_titles),
-                text=random.choice(question_texts),
-            )
-            question.tags.add(*random.sample(tags, k=random.randint(1, 3)))
-            questions.append(question)
+        question_ids = array("q")
+        questions = (
+            {
+                "author_id": rng.choice(user_ids),
+                "title": rng.choice(QUESTION_TITLES),
+                "text": rng.choice(QUESTION_TEXTS),
+            }
+            for _ in range(ratio * 10)
+        )
+        Through = Question.tags.through
+        for batch in batched(questions):
+            ids = insert(Question, batch)
+            question_ids.extend(ids)
+            insert(Through, [
+                {"question_id": pk, "tag_id": tag_id}
+                for pk in ids
+                for tag_id in rng.sample(tag_ids, k=rng.randint(1, 3))
+            ])
 
         self.stdout.write(self.style.SUCCESS("Создание ответов..."))
-        answers = []
-        for _ in range(ratio * 100):
-            author = random.choice(users)
-            question = random.choice(questions)
-            answer = Answer.objects.create(
-                author=author,
-                question=question,
-                text=random.choice(answer_texts),
-                is_correct=random.choice([True, False]),
-            )
-            answers.append(answer)
+        answer_ids = array("q")
+        positions = array("L", [0]) * len(question_ids)  # последний номер ответа по вопросу
 
-        num_likes_needed = ratio * 200
+        def answers():
+            for _ in range(ratio * 100):
+                qi = rng.randrange(len(question_ids))
+                positions[qi] += 1
+                yield {
+                    "author_id": rng.choice(user_ids),
+                    "question_id": question_ids[qi],
+                    "text": rng.choice(ANSWER_TEXTS),
+                    "is_correct": rng.random() < 0.5,
+                    "position": positions[qi],
+                }
 
-        question_pairs = list(product(users, questions))
-        answer_pairs = list(product(users, answers))
-        all_pairs = [("question", user, obj) for user, obj in question_pairs] + \
-                    [("answer", user, obj) for user, obj in answer_pairs]
+        for batch in batched(answers()):
+            answer_ids.extend(insert(Answer, batch))
 
-        max_likes = len(all_pairs)
+        self.stdout.write(self.style.SUCCESS("Создание лайков..."))
+        # Лайки распределяются по пользователям поровну, каждому —
+        # rng.sample по range(вопросы + ответы): пары уникальны без
+        # построения декартова произведения, память — O(пачки)
+        targets = len(question_ids) + len(answer_ids)
+        num_likes_needed = ratio * 200
+        max_likes = len(user_ids) * targets
         if num_likes_needed > max_likes:
             self.stdout.write(self.style.WARNING(
                 f"Можно создать только {max_likes} уникальных лайков (у вас {num_likes_needed} требуется)."
             ))
             num_likes_needed = max_likes
 
-        random.shuffle(all_pairs)
-        selected_pairs = all_pairs[:num_likes_needed]
-
-        count_q = 0
-        count_a = 0
-        for pair_type, user, obj in selected_pairs:
-            if pair_type == "question":
-                QuestionLike.objects.create(user=user, question=obj)
-                count_q += 1
-            else:
-                AnswerLike.objects.create(user=user, answer=obj)
-                count_a += 1
+        per_user, extra = divmod(num_likes_needed, len(user_ids))
+
+        def likes():
+            for ui, user_id in enumerate(user_ids):
+                for item in rng.sample(range(targets), per_user + (ui < extra)):
+                    if item < len(question_ids):
+                        yield QuestionLike, {"user_id": user_id, "question_id": question_ids[item]}
+                    else:
+                        yield AnswerLike, {"user_id": user_id, "answer_id": answer_ids[item - len(question_ids)]}
+
+        for batch in batched(likes()):
+            for model in (QuestionLike, AnswerLike):
+                rows = [row for m, row in batch if m is model]
+                if rows:
+                    insert(model, rows)
+
+        for writer in writers.values():
+            writer.close()
+
+        # bulk_create/COPY не вызывают сигналы — счётчики и рейтинг считаются разом
+        self.stdout.write(self.style.SUCCESS("Пересчёт счётчиков..."))
+        with transaction.atomic():
+            call_command("recount_counters", stdout=self.stdout)
+            call_command("refresh_hot_scores", stdout=self.stdout)
+        invalidate_popular_tags()
 
         self.stdout.write(self.style.SUCCESS("База данных успешно заполнена тематическими FIFA-данными."))
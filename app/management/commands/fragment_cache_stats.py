@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from app.templatetags.fragments import get_stats, reset_stats
+
+
+class Command(BaseCommand):
+    help = "Показывает попадания и промахи кэша фрагментов (карточки вопросов, ответы)"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reset", action="store_true", help="Обнулить счётчики")
+
+    def handle(self, *args, **options):
+        stats = get_stats()
+        total = stats["hit"] + stats["miss"]
+        ratio = stats["hit"] / total * 100 if total else 0
+        self.stdout.write(f"Попаданий: {stats['hit']}, промахов: {stats['miss']}, hit ratio: {ratio:.1f}%")
+        if options["reset"]:
+            reset_stats()
+            self.stdout.write(self.style.SUCCESS("Счётчики обнулены"))
@@ -0,0 +1,109 @@
+import posixpath
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from app.models import Profile
+from app.thumbnails import generate_thumbnails, thumbnail_names
+
+
+def _walk(storage, path):
+    dirs, files = storage.listdir(path)
+    for filename in files:
+        yield posixpath.join(path, filename)
+    for dirname in dirs:
+        yield from _walk(storage, posixpath.join(path, dirname))
+
+
+class Command(BaseCommand):
+    help = (
+        "Удаляет из media/avatars/ файлы, на которые не ссылается ни один профиль, "
+        "вместе с их миниатюрами и пустыми каталогами"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true", help="Только показать, что будет удалено")
+        parser.add_argument(
+            "--min-age", type=int, default=3600,
+            help="Не трогать файлы моложе N секунд: их профиль может быть ещё не сохранён",
+        )
+        parser.add_argument(
+            "--rehash", action="store_true",
+            help="Перенести старые аватары (avatars/<имя>) в хранилище по хешу содержимого",
+        )
+
+    def handle(self, *args, **options):
+        self.storage = Profile._meta.get_field("avatar").storage
+        if not self.storage.exists("avatars"):
+            self.stdout.write(self.style.SUCCESS("Каталог аватаров пуст"))
+            return
+
+        if options["rehash"]:
+            self.rehash(options["dry_run"])
+
+        referenced = set(
+            Profile.objects.exclude(avatar="").exclude(avatar__isnull=True)
+            .order_by().values_list("avatar", flat=True).distinct()
+        )
+        referenced.update(*(thumbnail_names(name) for name in list(referenced)))
+        cutoff = timezone.now() - timedelta(seconds=options["min_age"])
+
+        names = list(_walk(self.storage, "avatars"))
+        if options["min_age"]:
+            # свежие файлы (и миниатюры свежих оригиналов) могут быть нужны ещё не
+            # закоммиченным профилям; повторная загрузка того же файла обновляет
+            # его mtime (ContentAddressedStorage._save)
+            young = {name for name in names if self.storage.get_modified_time(name) > cutoff}
+            referenced |= young
+            referenced.update(*(thumbnail_names(name) for name in young))
+
+        removed = freed = 0
+        for name in names:
+            if name in referenced:
+                continue
+            freed += self.storage.size(name)
+            removed += 1
+            if options["dry_run"]:
+                self.stdout.write(f"  {name}")
+            else:
+                self.storage.delete(name)
+
+        if not options["dry_run"]:
+            self.remove_empty_dirs("avatars")
+
+        verb = "Будет удалено" if options["dry_run"] else "Удалено"
+        self.stdout.write(self.style.WARNING(
+            f"{verb} файлов аватаров: {removed} ({freed / 1024 / 1024:.1f} МБ)"
+        ))
+
+    def rehash(self, dry_run):
+        # повторный save() в ContentAddressedStorage возвращает имя по хешу;
+        # старый файл остаётся без ссылок и удаляется ниже этим же запуском
+        legacy = (
+            Profile.objects.exclude(avatar="").exclude(avatar__isnull=True)
+            .order_by().values_list("avatar", flat=True).distinct()
+        )
+        moved = 0
+        for name in list(legacy):
+            if self.storage.is_hashed(name) or not self.storage.exists(name):
+                continue
+            moved += 1
+            if dry_run:
+                self.stdout.write(f"  {name} -> по хешу")
+                continue
+            with self.storage.open(name, "rb") as f:
+                new_name = self.storage.save(name, f)
+            Profile.objects.filter(avatar=name).update(avatar=new_name, thumbnails_for="")
+            generate_thumbnails(new_name)
+        self.stdout.write(self.style.SUCCESS(f"Перенесено в хранилище по хешу: {moved}"))
+
+    def remove_empty_dirs(self, path):
+        dirs, files = self.storage.listdir(path)
+        empty = not files
+        for dirname in dirs:
+            empty &= self.remove_empty_dirs(posixpath.join(path, dirname))
+        if empty and path != "avatars":
+            # listdir/delete у FileSystemStorage работают и с каталогами
+            self.storage.delete(path)
+        return empty
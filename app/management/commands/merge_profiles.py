@@ -0,0 +1,113 @@
+import json
+import os
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from app.profiling import read_collapsed
+
+
+def _speedscope(name, stacks, interval):
+    frames, index = [], {}
+    samples, weights = [], []
+    for stack, count in stacks.most_common():
+        sample = []
+        for frame in stack.split(";"):
+            if frame not in index:
+                index[frame] = len(frames)
+                frames.append({"name": frame})
+            sample.append(index[frame])
+        samples.append(sample)
+        weights.append(count * interval)
+    return {
+        "$schema": "https://www.speedscope.app/file-format-schema.json",
+        "name": name,
+        "exporter": "merge_profiles",
+        "shared": {"frames": frames},
+        "profiles": [{
+            "type": "sampled",
+            "name": name,
+            "unit": "seconds",
+            "startValue": 0,
+            "endValue": sum(weights),
+            "samples": samples,
+            "weights": weights,
+        }],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Объединяет профили из PROFILE_DIR по url_name: пишет <url_name>.collapsed "
+        "(flamegraph.pl, inferno, speedscope), all.collapsed с url_name в корне стека "
+        "и печатает самые горячие функции"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dir", default=None, help="Каталог профилей (по умолчанию PROFILE_DIR)")
+        parser.add_argument("--output", default=None, help="Куда писать результат (по умолчанию <dir>/merged)")
+        parser.add_argument("--url-name", nargs="+", default=None, help="Только эти url_name")
+        parser.add_argument("--since", type=float, default=None, help="Только профили за последние N минут")
+        parser.add_argument("--speedscope", action="store_true", help="Дополнительно писать .speedscope.json")
+        parser.add_argument("--top", type=int, default=10, help="Сколько горячих функций печатать")
+
+    def handle(self, *args, **options):
+        root = options["dir"] or getattr(settings, "PROFILE_DIR", None)
+        if not root or not os.path.isdir(root):
+            raise CommandError("Каталог профилей не найден: задайте PROFILE_DIR или --dir")
+        output = options["output"] or os.path.join(root, "merged")
+        since = time.time() - options["since"] * 60 if options["since"] else None
+        interval = getattr(settings, "PROFILE_INTERVAL", 0.005)
+
+        merged = {}
+        for url_name in sorted(os.listdir(root)):
+            directory = os.path.join(root, url_name)
+            if directory == output or not os.path.isdir(directory):
+                continue
+            if options["url_name"] and url_name not in options["url_name"]:
+                continue
+            stacks, files = Counter(), 0
+            for filename in os.listdir(directory):
+                path = os.path.join(directory, filename)
+                if not filename.endswith(".collapsed") or (since and os.path.getmtime(path) < since):
+                    continue
+                read_collapsed(path, stacks)
+                files += 1
+            if stacks:
+                merged[url_name] = (stacks, files)
+
+        if not merged:
+            self.stdout.write(self.style.WARNING("Профилей не найдено"))
+            return
+
+        os.makedirs(output, exist_ok=True)
+        combined = Counter()
+        for url_name, (stacks, files) in merged.items():
+            self.write(os.path.join(output, f"{url_name}.collapsed"), stacks)
+            if options["speedscope"]:
+                with open(os.path.join(output, f"{url_name}.speedscope.json"), "w", encoding="utf-8") as f:
+                    json.dump(_speedscope(url_name, stacks, interval), f)
+            for stack, count in stacks.items():
+                combined[f"{url_name};{stack}"] += count
+            self.report(url_name, stacks, files, interval, options["top"])
+        self.write(os.path.join(output, "all.collapsed"), combined)
+        self.stdout.write(self.style.SUCCESS(f"Результат в {output}"))
+
+    def write(self, path, stacks):
+        with open(path, "w", encoding="utf-8") as f:
+            for stack, count in stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def report(self, url_name, stacks, files, interval, top):
+        total = sum(stacks.values())
+        self.stdout.write(self.style.WARNING(
+            f"{url_name}: {files} профилей, {total} снимков (~{total * interval:.2f} с)"
+        ))
+        # собственное время: сколько раз функция была листом стека
+        leaves = Counter()
+        for stack, count in stacks.items():
+            leaves[stack.rpartition(";")[2]] += count
+        for frame, count in leaves.most_common(top):
+            self.stdout.write(f"  {count / total:6.1%}  {frame}")
@@ -0,0 +1,15 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app.profiling import make_token
+
+
+class Command(BaseCommand):
+    help = "Выдаёт подписанный токен для заголовка X-Profile: запрос с ним будет профилирован"
+
+    def handle(self, *args, **options):
+        if not getattr(settings, "PROFILE_DIR", None):
+            self.stdout.write(self.style.WARNING("PROFILE_DIR не задан — профилировщик выключен"))
+        max_age = getattr(settings, "PROFILE_TOKEN_MAX_AGE", 3600)
+        self.stdout.write(f"X-Profile: {make_token()}")
+        self.stdout.write(self.style.SUCCESS(f"Токен действителен {max_age} с"))
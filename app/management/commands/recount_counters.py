@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, Max, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+
+from app.models import Question, Answer, QuestionLike, AnswerLike, Tag, hot_score_expression
+
+
+def _aggregate_of(model, fk, aggregate):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{fk: OuterRef("pk")})
+                .order_by()
+                .values(fk)
+                .annotate(c=aggregate)
+                .values("c")
+        ),
+        0,
+    )
+
+
+def _count_of(model, fk):
+    return _aggregate_of(model, fk, Count("pk"))
+
+
+class Command(BaseCommand):
+    help = "Пересчитывает денормализованные счётчики лайков, ответов и тегов и исправляет расхождения"
+
+    def handle(self, *args, **options):
+        # (модель, поле, фактическое значение, условие расхождения)
+        targets = [
+            (Question, "likes_count", _count_of(QuestionLike, "question"), "differs"),
+            (Question, "answers_count", _count_of(Answer, "question"), "differs"),
+            # после удаления ответов answers_seq больше максимума — это нормально
+            (Question, "answers_seq", _aggregate_of(Answer, "question", Max("position")), "behind"),
+            (Answer, "likes_count", _count_of(AnswerLike, "answer"), "differs"),
+            (Tag, "questions_count", _count_of(Question.tags.through, "tag"), "differs"),
+        ]
+        questions_fixed = 0
+        with transaction.atomic():
+            for model, field, actual, drift in targets:
+                if drift == "behind":
+                    condition = Q(**{f"{field}__lt": F("actual")})
+                else:
+                    condition = ~Q(**{field: F("actual")})
+                fixed = (
+                    model.objects
+                        .annotate(actual=actual)
+                        .filter(condition)
+                        .update(**{field: actual})
+                )
+                if model is Question:
+                    questions_fixed += fixed
+                label = f"{model.__name__}.{field}"
+                if fixed:
+                    self.stdout.write(self.style.WARNING(f"{label}: исправлено строк — {fixed}"))
+                else:
+                    self.stdout.write(self.style.SUCCESS(f"{label}: расхождений нет"))
+            if questions_fixed:
+                Question.objects.update(hot_score=hot_score_expression())
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Max
+
+from app.models import Question, hot_score_expression
+
+
+class Command(BaseCommand):
+    help = (
+        "Пересчитывает Question.hot_score пачками по id. "
+        "Нужен после изменения HOT_* в настройках и для периодической сверки"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch", type=int, default=10000, help="Размер пачки (по id)")
+
+    def handle(self, *args, **options):
+        batch = options["batch"]
+        last_id = Question.objects.aggregate(m=Max("id"))["m"] or 0
+        updated = 0
+        for start in range(0, last_id + 1, batch):
+            with transaction.atomic():
+                updated += (
+                    Question.objects
+                        .filter(id__gte=start, id__lt=start + batch)
+                        .update(hot_score=hot_score_expression())
+                )
+        self.stdout.write(self.style.SUCCESS(f"Пересчитан рейтинг {updated} вопросов"))
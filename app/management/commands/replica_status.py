@@ -0,0 +1,28 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from app.db import measure_lag, replica_aliases
+
+
+class Command(BaseCommand):
+    help = "Показывает отставание реплик (DATABASE_REPLICAS) и участвуют ли они в чтении"
+
+    def handle(self, *args, **options):
+        aliases = replica_aliases()
+        if not aliases:
+            self.stdout.write(self.style.WARNING("Реплики не настроены, всё читается с primary"))
+            return
+
+        max_lag = getattr(settings, "REPLICA_MAX_LAG_SECONDS", 10)
+        for alias in aliases:
+            db = settings.DATABASES[alias]
+            label = f"{alias} ({db['HOST']}:{db['PORT']})"
+            try:
+                lag = measure_lag(alias)
+            except Exception as e:
+                self.stdout.write(self.style.ERROR(f"{label}: недоступна — {e}"))
+                continue
+            if lag > max_lag:
+                self.stdout.write(self.style.ERROR(f"{label}: отставание {lag:.1f} с, выведена из ротации"))
+            else:
+                self.stdout.write(self.style.SUCCESS(f"{label}: отставание {lag:.1f} с"))
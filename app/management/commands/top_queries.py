@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from app.querystats import collect, shared_store
+
+SORT_KEYS = {
+    "total": lambda v: v[1],
+    "max": lambda v: v[2],
+    "count": lambda v: v[0],
+    "avg": lambda v: v[1] / v[0],
+    "rows": lambda v: v[3],
+}
+
+
+class Command(BaseCommand):
+    help = (
+        "Самые дорогие формы SQL-запросов по всем процессам за последние N минут "
+        "(статистика app/querystats.py из общего кэша)"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--minutes", type=float, default=60, help="Период, минут")
+        parser.add_argument("--limit", type=int, default=15, help="Сколько форм показать")
+        parser.add_argument("--sort", choices=sorted(SORT_KEYS), default="total", help="Порядок сортировки")
+        parser.add_argument("--width", type=int, default=200, help="Обрезать текст запроса до стольких символов")
+
+    def handle(self, *args, **options):
+        if not shared_store():
+            raise CommandError("Кэш по умолчанию не общий для процессов: статистика воркеров ему недоступна, задайте REDIS_URL или MEMCACHED_LOCATION")
+        if not getattr(settings, "QUERY_STATS", False):
+            self.stdout.write(self.style.WARNING("QUERY_STATS выключен в этом окружении — воркеры пишут статистику, только если он включён у них"))
+        totals, workers = collect(options["minutes"])
+        if not totals:
+            self.stdout.write(self.style.WARNING(f"Нет данных за {options['minutes']:g} мин"))
+            return
+
+        grand_total = sum(v[1] for v in totals.values())
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(totals)} форм, {sum(v[0] for v in totals.values())} запросов, "
+            f"{grand_total:.2f} с в базе, процессов: {workers}"
+        ))
+        self.stdout.write(f"{'всего, мс':>10} {'доля':>6} {'раз':>8} {'сред, мс':>9} {'макс, мс':>9} {'строк/раз':>10}  запрос")
+        rows = sorted(totals.items(), key=lambda item: SORT_KEYS[options["sort"]](item[1]), reverse=True)
+        for shape, (count, total, longest, returned) in rows[:options["limit"]]:
+            share = total / grand_total if grand_total else 0.0
+            line = (
+                f"{total * 1000:>10.1f} {share:>6.1%} {count:>8} {total / count * 1000:>9.2f} "
+                f"{longest * 1000:>9.2f} {returned / count:>10.1f}  {shape[:options['width']]}"
+            )
+            self.stdout.write(self.style.ERROR(line) if share >= 0.25 else line)
@@ -0,0 +1,212 @@
+import asyncio
+import time
+from functools import wraps
+from hashlib import md5
+
+from asgiref.sync import iscoroutinefunction, sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.http import HttpResponse
+from django.utils.cache import patch_vary_headers
+
+from .conditional import FEEDS, SITE, question_scope, touch
+from .middleware import STICKY_COOKIE
+
+# Полностраничный кэш для анонимных GET/HEAD. Запись свежая MICROCACHE_TTL
+# секунд и ещё MICROCACHE_STALE секунд отдаётся устаревшей: пересобирает её
+# только тот, кто взял блокировку (cache.add), остальные получают старую копию.
+# Сброс — сменой поколения области (scope): "feeds" для лент, "question:<id>"
+# для страницы вопроса; старые ключи просто вытесняются.
+# Блокировка и поколение верны только при атомарных add/incr общего кэша
+# (Redis, memcached) — это требует проверка app.E001 (app/checks.py).
+
+WAIT_STEP = 0.05
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def _generation_key(scope):
+    return f"microcache:gen:{scope}"
+
+
+def _entry_key(scope, generation, request):
+    path = md5(request.get_full_path().encode(), usedforsecurity=False).hexdigest()
+    return f"microcache:{scope}:{generation}:{request.method}:{path}"
+
+
+def _cacheable_request(request):
+    # анонимность определяется без обращения к базе: нет cookie сессии —
+    # нет и пользователя; после записи (primary_until) нужны свежие данные
+    return (
+        request.method in ("GET", "HEAD")
+        and settings.SESSION_COOKIE_NAME not in request.COOKIES
+        and STICKY_COOKIE not in request.COOKIES
+    )
+
+
+def _cacheable_response(response):
+    # ответ с cookie (сессия, csrftoken) принадлежит конкретному клиенту
+    return (
+        response.status_code == 200
+        and not response.streaming
+        and not response.cookies
+        and "private" not in response.get("Cache-Control", "")
+    )
+
+
+def _pack(response):
+    ttl = _setting("MICROCACHE_TTL", 1)
+    headers = [(k, v) for k, v in response.items() if k.lower() != "x-microcache"]
+    return (time.time() + ttl, response.status_code, headers, response.content)
+
+
+def _unpack(entry, state):
+    _, status, headers, content = entry
+    response = HttpResponse(content, status=status)
+    for name, value in headers:
+        response[name] = value
+    response["X-Microcache"] = state
+    return response
+
+
+def _timeouts():
+    ttl = _setting("MICROCACHE_TTL", 1)
+    return ttl + _setting("MICROCACHE_STALE", 10), _setting("MICROCACHE_LOCK_TIMEOUT", 5)
+
+
+def _finish(response, state):
+    patch_vary_headers(response, ("Cookie",))
+    response["X-Microcache"] = state
+    return response
+
+
+def _lock_key(key):
+    return f"{key}:lock"
+
+
+def _lookup(request, name):
+    """
+    -> (ключ, ответ из кэша или None, взята ли блокировка пересборки).
+    Без ответа и без блокировки страницу собирает другой запрос — см. _poll.
+    """
+    generation = cache.get(_generation_key(name), 0)
+    key = _entry_key(name, generation, request)
+    entry = cache.get(key)
+    if entry is not None and entry[0] > time.time():
+        return key, _unpack(entry, "HIT"), False
+    if cache.add(_lock_key(key), 1, _timeouts()[1]):
+        return key, None, True
+    if entry is not None:
+        return key, _unpack(entry, "STALE"), False
+    return key, None, False
+
+
+def _poll(key):
+    # холодный ключ: -> (ответ, ждать ли дальше); без блокировки ждать нечего —
+    # ответ оказался некэшируемым (404 и т.п.) или владелец упал
+    entry = cache.get(key)
+    if entry is not None:
+        return _unpack(entry, "HIT"), False
+    return None, cache.get(_lock_key(key)) is not None
+
+
+def _store(key, response):
+    if _cacheable_response(response):
+        cache.set(key, _pack(response), _timeouts()[0])
+
+
+def _release(key):
+    cache.delete(_lock_key(key))
+
+
+def _wait_steps():
+    return int(_timeouts()[1] / WAIT_STEP)
+
+
+def microcache(scope):
+    """
+    @microcache("feeds") или @microcache("question:{question_id}") —
+    scope форматируется аргументами представления из URL.
+    """
+
+    def decorator(view):
+        if iscoroutinefunction(view):
+            @wraps(view)
+            async def wrapper(request, *args, **kwargs):
+                if not _cacheable_request(request):
+                    return await view(request, *args, **kwargs)
+                key, response, owner = await sync_to_async(_lookup)(request, scope.format(**kwargs))
+                if response is not None:
+                    return response
+                if not owner:
+                    for _ in range(_wait_steps()):
+                        await asyncio.sleep(WAIT_STEP)
+                        response, waiting = await sync_to_async(_poll)(key)
+                        if not waiting:
+                            break
+                    if response is not None:
+                        return response
+                    return _finish(await view(request, *args, **kwargs), "BYPASS")
+                try:
+                    response = _finish(await view(request, *args, **kwargs), "MISS")
+                    await sync_to_async(_store)(key, response)
+                finally:
+                    await sync_to_async(_release)(key)
+                return response
+        else:
+            @wraps(view)
+            def wrapper(request, *args, **kwargs):
+                if not _cacheable_request(request):
+                    return view(request, *args, **kwargs)
+                key, response, owner = _lookup(request, scope.format(**kwargs))
+                if response is not None:
+                    return response
+                if not owner:
+                    for _ in range(_wait_steps()):
+                        time.sleep(WAIT_STEP)
+                        response, waiting = _poll(key)
+                        if not waiting:
+                            break
+                    if response is not None:
+                        return response
+                    return _finish(view(request, *args, **kwargs), "BYPASS")
+                try:
+                    response = _finish(view(request, *args, **kwargs), "MISS")
+                    _store(key, response)
+                finally:
+                    _release(key)
+                return response
+        return wrapper
+
+    return decorator
+
+
+def purge(*scopes):
+    # новое поколение — новые ключи; вызывается из transaction.on_commit
+    for scope in scopes:
+        key = _generation_key(scope)
+        if not cache.add(key, 1, None):
+            try:
+                cache.incr(key)
+            except ValueError:
+                # ключ вытеснен между add и incr: 1 могла быть поколением
+                # ещё живых записей, время в наносекундах заведомо новое
+                cache.set(key, time.time_ns(), None)
+
+
+def purge_pages(*question_ids, site=False):
+    """
+    После записи, внутри её транзакции: сбрасывает страницы лент и вопросов
+    и обновляет маркеры ETag (app/conditional.py); site — ещё и сайдбар
+    тегов на всех страницах. Выполняется в transaction.on_commit.
+    """
+    scopes = [FEEDS, *(question_scope(pk) for pk in question_ids)]
+
+    def changed():
+        purge(*scopes)
+        touch(*scopes, *([SITE] if site else []))
+
+    transaction.on_commit(changed)
@@ -0,0 +1,282 @@
+import logging
+import mimetypes
+import os
+import random
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.contrib.staticfiles.storage import staticfiles_storage
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from .db import replica_aliases, replica_reads, track_writes
+from .profiling import StackSampler, save_profile, track_thread_parents, valid_token
+from .querylog import record_queries
+
+logger = logging.getLogger(__name__)
+
+STICKY_COOKIE = "primary_until"
+
+
+class ReplicaMiddleware:
+    """
+    GET/HEAD-запросы читают с реплик. После запроса с записью (POST или
+    запись в GET, например выход) клиент получает cookie и следующие
+    REPLICA_STICKY_SECONDS секунд читает с primary — свои изменения он видит сразу.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = bool(replica_aliases())
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def use_replica(self, request):
+        if not self.enabled or request.method not in ("GET", "HEAD"):
+            return False
+        try:
+            return float(request.COOKIES.get(STICKY_COOKIE, 0)) < time.time()
+        except ValueError:
+            return True
+
+    def stick(self, request, response, wrote):
+        if not self.enabled or not (wrote or request.method not in ("GET", "HEAD")):
+            return response
+        window = getattr(settings, "REPLICA_STICKY_SECONDS", 10)
+        response.set_cookie(
+            STICKY_COOKIE, f"{time.time() + window:.0f}",
+            max_age=window, httponly=True, samesite="Lax",
+        )
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with track_writes() as wrote, replica_reads(self.use_replica(request)):
+            response = self.get_response(request)
+            return self.stick(request, response, wrote.get())
+
+    async def __acall__(self, request):
+        with track_writes() as wrote, replica_reads(self.use_replica(request)):
+            response = await self.get_response(request)
+            return self.stick(request, response, wrote.get())
+
+
+class QueryBudgetMiddleware:
+    """
+    Считает SQL-запросы и время в базе на каждый запрос. В DEBUG добавляет
+    заголовок Server-Timing и пишет в лог превышение QUERY_BUDGETS для
+    url_name и повторяющиеся формы запросов (признак N+1).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.enabled = settings.DEBUG or getattr(settings, "QUERY_BUDGET_ALWAYS", False)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def report(self, request, response, recorder):
+        response.headers["Server-Timing"] = (
+            f'db;dur={recorder.duration * 1000:.1f};desc="{recorder.count} SQL"'
+        )
+        match = request.resolver_match
+        url_name = match.url_name if match else None
+        # бюджеты заданы для страниц; POST с записью в них не укладывается и не должен
+        budget = getattr(settings, "QUERY_BUDGETS", {}).get(url_name)
+        if budget is not None and request.method in ("GET", "HEAD") and recorder.count > budget:
+            logger.warning(
+                "%s: %d SQL-запросов при бюджете %d (%s)",
+                url_name, recorder.count, budget, request.get_full_path(),
+            )
+        for shape, n in recorder.repeated(getattr(settings, "QUERY_REPEAT_THRESHOLD", 5)):
+            logger.warning("%s: запрос повторён %d раз, возможен N+1: %s", url_name, n, shape[:300])
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not self.enabled:
+            return self.get_response(request)
+        with record_queries() as recorder:
+            response = self.get_response(request)
+        return self.report(request, response, recorder)
+
+    async def __acall__(self, request):
+        if not self.enabled:
+            return await self.get_response(request)
+        with record_queries() as recorder:
+            response = await self.get_response(request)
+        return self.report(request, response, recorder)
+
+
+# Content-Encoding -> суффикс заранее сжатого файла (app.storage), в порядке предпочтения
+STATIC_ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+
+def _accepted_encodings(header):
+    accepted = set()
+    for part in header.split(","):
+        coding, _, params = part.partition(";")
+        params = params.replace(" ", "")
+        if params.startswith("q="):
+            try:
+                if float(params[2:]) <= 0:
+                    continue
+            except ValueError:
+                continue
+        accepted.add(coding.strip().lower())
+    return accepted
+
+
+class StaticFilesMiddleware:
+    """
+    Раздаёт STATIC_ROOT после collectstatic без отдельного веб-сервера:
+    выбирает .br/.gz по Accept-Encoding, отвечает 304 по ETag, файлам с хешем
+    в имени ставит Cache-Control immutable на год, остальным — STATIC_MAX_AGE.
+    Список файлов строится при старте: после collectstatic нужен перезапуск.
+    В DEBUG не используется — статику отдаёт runserver из STATICFILES_DIRS.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        root = settings.STATIC_ROOT
+        if settings.DEBUG or not root or not os.path.isdir(root):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.prefix = settings.STATIC_URL
+        self.files = self.scan(root)
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def scan(self, root):
+        hashed = set(getattr(staticfiles_storage, "hashed_files", {}).values())
+        max_age = getattr(settings, "STATIC_MAX_AGE", 60)
+        files = {}
+        for dirpath, _, filenames in os.walk(root):
+            for filename in filenames:
+                path = os.path.join(dirpath, filename)
+                name = os.path.relpath(path, root).replace(os.sep, "/")
+                if name.endswith((".gz", ".br")) or name == getattr(staticfiles_storage, "manifest_name", None):
+                    continue
+                variants = {None: path}
+                for encoding, suffix in STATIC_ENCODINGS:
+                    if os.path.exists(path + suffix):
+                        variants[encoding] = path + suffix
+                content_type, _ = mimetypes.guess_type(filename)
+                files[name] = (
+                    content_type or "application/octet-stream",
+                    variants,
+                    IMMUTABLE if name in hashed else f"public, max-age={max_age}",
+                )
+        return files
+
+    def serve(self, request):
+        if not request.path.startswith(self.prefix) or request.method not in ("GET", "HEAD"):
+            return None
+        entry = self.files.get(request.path[len(self.prefix):])
+        if entry is None:
+            return None  # 404 отдаст Django
+        content_type, variants, cache_control = entry
+
+        encoding = None
+        accepted = _accepted_encodings(request.headers.get("Accept-Encoding", ""))
+        for candidate, _ in STATIC_ENCODINGS:
+            if candidate in variants and candidate in accepted:
+                encoding = candidate
+                break
+        path = variants[encoding]
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        etag = f'"{int(stat.st_mtime):x}-{stat.st_size:x}{"-" + encoding if encoding else ""}"'
+
+        response = get_conditional_response(request, etag=etag, last_modified=int(stat.st_mtime))
+        if response is None:
+            if request.method == "HEAD":
+                response = HttpResponse(content_type=content_type)
+            else:
+                response = FileResponse(open(path, "rb"), content_type=content_type)
+                del response["Content-Disposition"]
+            response["Content-Length"] = stat.st_size
+            response["Last-Modified"] = http_date(stat.st_mtime)
+            if encoding:
+                response["Content-Encoding"] = encoding
+        response["ETag"] = etag
+        response["Cache-Control"] = cache_control
+        if len(variants) > 1:
+            patch_vary_headers(response, ("Accept-Encoding",))
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        return self.serve(request) or self.get_response(request)
+
+    async def __acall__(self, request):
+        return self.serve(request) or await self.get_response(request)
+
+
+class ProfilingMiddleware:
+    """
+    Профилирование по запросу (app/profiling.py). Включается PROFILE_DIR;
+    профилируется доля PROFILE_SAMPLE_RATE запросов и любой запрос с
+    заголовком X-Profile, подписанным токеном из `manage.py profile_token`.
+    Профили пишутся в PROFILE_DIR/<url_name>/, объединяет их merge_profiles.
+
+    Только под WSGI: под ASGI ORM выполняется в общем потоке sync_to_async,
+    а цикл событий делят параллельные запросы — снимки стеков нельзя отнести
+    к конкретному запросу, и профиль был бы неверным.
+    """
+
+    sync_capable = True
+    async_capable = True   # чтобы узнать об ASGI (асинхронная цепочка) и отключиться
+
+    def __init__(self, get_response):
+        if not getattr(settings, "PROFILE_DIR", None):
+            raise MiddlewareNotUsed
+        if iscoroutinefunction(get_response):
+            logger.warning("ProfilingMiddleware работает только под WSGI, под ASGI профилирование отключено")
+            raise MiddlewareNotUsed
+        track_thread_parents()
+        self.get_response = get_response
+        self.rate = getattr(settings, "PROFILE_SAMPLE_RATE", 0)
+        self.interval = getattr(settings, "PROFILE_INTERVAL", 0.005)
+
+    def wanted(self, request):
+        token = request.headers.get("X-Profile")
+        if token:
+            return valid_token(token)
+        return self.rate > 0 and random.random() < self.rate
+
+    def save(self, request, response, sampler):
+        if not sampler.stacks:
+            return response
+        match = request.resolver_match
+        try:
+            path = save_profile(match.url_name if match else None, sampler.stacks)
+        except OSError:
+            logger.exception("Не удалось сохранить профиль %s", request.get_full_path())
+            return response
+        if "X-Profile" in request.headers:
+            response.headers["X-Profile"] = os.path.relpath(path, settings.PROFILE_DIR)
+        return response
+
+    def __call__(self, request):
+        if not self.wanted(request):
+            return self.get_response(request)
+        with StackSampler(self.interval) as sampler:
+            response = self.get_response(request)
+        return self.save(request, response, sampler)
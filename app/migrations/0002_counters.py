@@ -0,0 +1,55 @@
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def _count_of(model, fk):
+    return Coalesce(
+        Subquery(
+            model.objects.filter(**{fk: OuterRef("pk")})
+                .order_by()
+                .values(fk)
+                .annotate(c=Count("pk"))
+                .values("c")
+        ),
+        0,
+    )
+
+
+def fill_counters(apps, schema_editor):
+    Question = apps.get_model("app", "Question")
+    Answer = apps.get_model("app", "Answer")
+    QuestionLike = apps.get_model("app", "QuestionLike")
+    AnswerLike = apps.get_model("app", "AnswerLike")
+
+    Question.objects.update(
+        likes_count=_count_of(QuestionLike, "question"),
+        answers_count=_count_of(Answer, "question"),
+    )
+    Answer.objects.update(likes_count=_count_of(AnswerLike, "answer"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0001_initial"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="question",
+            name="likes_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="question",
+            name="answers_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="answer",
+            name="likes_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
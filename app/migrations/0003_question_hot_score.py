@@ -0,0 +1,30 @@
+from django.db import migrations, models
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Cast, Extract, Greatest, Log
+
+
+def fill_hot_score(apps, schema_editor):
+    Question = apps.get_model("app", "Question")
+    votes = Cast(Greatest(F("likes_count") + F("answers_count") * 2, 1), FloatField())
+    age = Cast(Extract("created_at", "epoch"), FloatField()) - Value(1735689600.0)
+    Question.objects.update(hot_score=Log(Value(10.0), votes) + age / Value(45000.0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0002_counters"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="question",
+            name="hot_score",
+            field=models.FloatField(default=0),
+        ),
+        migrations.RunPython(fill_hot_score, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="question",
+            index=models.Index(fields=["-hot_score", "-id"], name="question_hot_idx"),
+        ),
+    ]
@@ -0,0 +1,41 @@
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def fill_questions_count(apps, schema_editor):
+    Tag = apps.get_model("app", "Tag")
+    Question = apps.get_model("app", "Question")
+    Through = Question.tags.through
+    Tag.objects.update(
+        questions_count=Coalesce(
+            Subquery(
+                Through.objects.filter(tag=OuterRef("pk"))
+                    .order_by()
+                    .values("tag")
+                    .annotate(c=Count("pk"))
+                    .values("c")
+            ),
+            0,
+        )
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0004_question_new_idx"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="tag",
+            name="questions_count",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(fill_questions_count, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name="tag",
+            index=models.Index(fields=["-questions_count", "id"], name="tag_popular_idx"),
+        ),
+    ]
@@ -0,0 +1,21 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0005_tag_questions_count"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="question",
+            name="version",
+            field=models.PositiveIntegerField(default=1),
+        ),
+        migrations.AddField(
+            model_name="answer",
+            name="version",
+            field=models.PositiveIntegerField(default=1),
+        ),
+    ]
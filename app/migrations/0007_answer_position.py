@@ -0,0 +1,43 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0006_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="answer",
+            name="position",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="question",
+            name="answers_seq",
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunSQL(
+            [
+                """
+                UPDATE app_answer SET position = numbered.rn
+                FROM (
+                    SELECT id, ROW_NUMBER() OVER (PARTITION BY question_id ORDER BY created_at, id) AS rn
+                    FROM app_answer
+                ) AS numbered
+                WHERE app_answer.id = numbered.id
+                """,
+                """
+                UPDATE app_question SET answers_seq = COALESCE(
+                    (SELECT MAX(position) FROM app_answer WHERE app_answer.question_id = app_question.id), 0
+                )
+                """,
+            ],
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name="answer",
+            constraint=models.UniqueConstraint(fields=["question", "position"], name="answer_question_position_uniq"),
+        ),
+    ]
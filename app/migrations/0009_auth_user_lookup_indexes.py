@@ -0,0 +1,39 @@
+from django.db import migrations
+
+# SignupForm/ProfileEditForm проверяют username__iexact
+# (UPPER("username"::text) = UPPER(%s)) и email = %s на каждой отправке.
+# auth_user принадлежит contrib.auth, поэтому индексы создаются SQL-ом;
+# CONCURRENTLY — чтобы не блокировать вход и регистрацию на живой базе.
+INDEXES = [
+    ("auth_user_username_upper_idx", 'UPPER("username"::text)'),
+    ("auth_user_email_idx", '"email"'),
+]
+
+
+def create_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, expression in INDEXES:
+        schema_editor.execute(
+            f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{name}" ON "auth_user" ({expression})'
+        )
+
+
+def drop_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "postgresql":
+        return
+    for name, _ in INDEXES:
+        schema_editor.execute(f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+
+
+class Migration(migrations.Migration):
+    atomic = False
+
+    dependencies = [
+        ("app", "0008_question_search_vector"),
+        ("auth", "0012_alter_user_first_name_max_length"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_indexes, drop_indexes),
+    ]
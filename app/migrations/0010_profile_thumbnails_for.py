@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("app", "0009_auth_user_lookup_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="profile",
+            name="thumbnails_for",
+            field=models.CharField(blank=True, editable=False, max_length=100),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.18 on 2026-10-18 09:31
+
+import app.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('app', '0010_profile_thumbnails_for'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='profile',
+            name='avatar',
+            field=models.ImageField(blank=True, null=True, storage=app.storage.avatar_storage, upload_to='avatars/'),
+        ),
+    ]
@@ -0,0 +1,43 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    # номера ответов становятся сплошными: удаление сдвигает следующие
+    # (Question.objects.close_answer_gap), поэтому уникальность отложена
+
+    dependencies = [
+        ("app", "0011_profile_avatar_storage"),
+    ]
+
+    operations = [
+        migrations.RemoveConstraint(
+            model_name="answer",
+            name="answer_question_position_uniq",
+        ),
+        migrations.RunSQL(
+            [
+                """
+                UPDATE app_answer SET position = numbered.rn
+                FROM (
+                    SELECT id, ROW_NUMBER() OVER (PARTITION BY question_id ORDER BY position, id) AS rn
+                    FROM app_answer
+                ) AS numbered
+                WHERE app_answer.id = numbered.id AND app_answer.position <> numbered.rn
+                """,
+                """
+                UPDATE app_question SET answers_seq = COALESCE(
+                    (SELECT MAX(position) FROM app_answer WHERE app_answer.question_id = app_question.id), 0
+                )
+                """,
+            ],
+            migrations.RunSQL.noop,
+        ),
+        migrations.AddConstraint(
+            model_name="answer",
+            constraint=models.UniqueConstraint(
+                deferrable=models.Deferrable.DEFERRED,
+                fields=["question", "position"],
+                name="answer_question_position_uniq",
+            ),
+        ),
+    ]
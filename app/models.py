@@ -1,51 +1,95 @@
-from math import ceil
-from django.db import models
+from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchQuery, SearchRank, SearchVectorField
+from django.db import models, transaction
+from django.db.models import F, FloatField, Value
+from django.db.models.functions import Cast, Extract, Greatest, Log
 from django.urls import reverse
 from django.contrib.auth.models import User
 
+from .storage import avatar_storage
+
+# Начало отсчёта для "горячего" рейтинга (2025-01-01 UTC), в секундах
+HOT_EPOCH = 1735689600
+
+
+def hot_score_expression(likes=None, answers=None):
+    """
+    Рейтинг в стиле Reddit: log10(голоса) + возраст / HOT_DECAY_SECONDS.
+    Каждые HOT_DECAY_SECONDS свежести весят как десятикратный рост голосов,
+    поэтому порядок совпадает с затуханием по возрасту, а значение меняется
+    только при изменении лайков/ответов — его можно хранить в индексе.
+    """
+    likes = F("likes_count") if likes is None else likes
+    answers = F("answers_count") if answers is None else answers
+    weight = getattr(settings, "HOT_ANSWER_WEIGHT", 2)
+    decay = getattr(settings, "HOT_DECAY_SECONDS", 45000)
+    votes = Cast(Greatest(likes + answers * weight, 1), FloatField())
+    age = Cast(Extract("created_at", "epoch"), FloatField()) - Value(float(HOT_EPOCH))
+    return Log(Value(10.0), votes) + age / Value(float(decay))
+
 
 # --------------------------- Tag ---------------------------
 class Tag(models.Model):
     name = models.CharField(max_length=64, unique=True)
+    # число вопросов с тегом, см. AskForm.save, app/signals.py и recount_counters
+    questions_count = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-questions_count", "id"], name="tag_popular_idx"),
+        ]
 
     def __str__(self):
         return self.name
 
 
 # ---------------------- Question manager -------------------
+# ключи сортировки лент, они же ключи keyset-пагинации (app.utils.paginate)
+NEW_KEYS = ("-created_at", "-id")
+HOT_KEYS = ("-hot_score", "-id")
+SEARCH_KEYS = ("-rank", "-id")
+# конфигурация to_tsvector: та же, что в триггере search_vector (миграция 0008);
+# сменить её можно только новой миграцией, пересоздающей триггер и вектора
+SEARCH_CONFIG = "russian"
+
+
 class QuestionQuerySet(models.QuerySet):
     def _related(self):
         return (
             self.select_related("author", "author__profile")
-                .prefetch_related("tags", "likes", "answers")
+                .prefetch_related("tags")
         )
 
     def feed_new(self):               # новые
-        return self._related().order_by("-created_at")
+        return self._related().order_by(*NEW_KEYS)
 
     def feed_hot(self):               # популярные
         return (
             self._related()
-                .annotate(likes_cnt=models.Count("likes"))
-                .order_by("-likes_cnt", "-created_at")
+                .order_by(*HOT_KEYS)
         )
 
     def feed_by_tag(self, tag_name):
-        return self._related().filter(tags__name=tag_name).order_by("-created_at")
+        return self._related().filter(tags__name=tag_name).order_by(*NEW_KEYS)
 
-    def full(self):
+    def search(self, query):
+        # search_vector поддерживает триггер в БД (миграция 0008)
+        search_query = SearchQuery(query, config=SEARCH_CONFIG, search_type="websearch")
         return (
-            self.select_related("author", "author__profile")
-                .prefetch_related(
-                    "tags",
-                    "likes",
-                    "answers",
-                    "answers__likes",
-                    "answers__author",
-                    "answers__author__profile",
-                )
+            self._related()
+                .filter(search_vector=search_query)
+                # ts_rank возвращает real; в double, чтобы значение из курсора
+                # keyset-пагинации сравнивалось с рангом без потери точности
+                .annotate(rank=Cast(SearchRank(F("search_vector"), search_query), FloatField()))
+                .order_by(*SEARCH_KEYS)
         )
 
+    def detail(self):
+        # только шапка вопроса; ответы грузятся постранично через
+        # get_answers_queryset(), счётчики берутся из колонок
+        return self.select_related("author", "author__profile").prefetch_related("tags")
+
 
 class QuestionManager(models.Manager):
     def get_queryset(self):
@@ -60,20 +104,86 @@ class QuestionManager(models.Manager):
     def feed_by_tag(self, tag_name):
         return self.get_queryset().feed_by_tag(tag_name)
 
-    def full(self):
-        return self.get_queryset().full()
+    def search(self, query):
+        return self.get_queryset().search(query)
+
+    def detail(self):
+        return self.get_queryset().detail()
+
+    def next_answer_position(self, question_id):
+        # UPDATE берёт блокировку строки вопроса до конца транзакции,
+        # поэтому параллельные ответы получают разные номера
+        qs = self.filter(pk=question_id)
+        qs.update(answers_seq=F("answers_seq") + 1)
+        return qs.values_list("answers_seq", flat=True).get()
+
+    def lock_answer_position(self, question_id, answer_id):
+        # до DELETE ответа: та же блокировка строки вопроса, что при вставке,
+        # поэтому удаления и новые ответы сдвигают номера по очереди;
+        # position перечитывается уже под блокировкой (None — ответ удалён)
+        list(self.select_for_update().filter(pk=question_id).values_list("pk", flat=True))
+        return Answer.objects.filter(pk=answer_id).values_list("position", flat=True).first()
+
+    def close_answer_gap(self, question_id, position):
+        # номера остаются сплошными (1..n), и страница ответа считается по
+        # position без COUNT; уникальность (question, position) отложена
+        # до конца транзакции (миграция 0012), сдвиг её не нарушает
+        Answer.objects.filter(question_id=question_id, position__gt=position).update(position=F("position") - 1)
+        self.filter(pk=question_id).update(answers_seq=Greatest(F("answers_seq") - 1, 0))
 
 
 # --------------------------- Question -----------------------
-class Question(models.Model):
+class AtomicSaveMixin:
+    # поля, которые меняют только UPDATE ... F() в app/signals.py: save() уже
+    # существующего объекта их не пишет, иначе старые значения из экземпляра
+    # затёрли бы чужие инкременты (и version, а с ней ключ кэша фрагментов)
+    managed_fields = ()
+
+    # сохранение и обработчики post_save (счётчики) — в одной транзакции
+    def save(self, *args, **kwargs):
+        if (
+            self.managed_fields and not self._state.adding
+            and kwargs.get("update_fields") is None and not kwargs.get("force_insert")
+        ):
+            kwargs["update_fields"] = [
+                f.name for f in self._meta.concrete_fields
+                if not f.primary_key and f.name not in self.managed_fields
+            ]
+        with transaction.atomic(using=kwargs.get("using"), savepoint=False):
+            super().save(*args, **kwargs)
+
+
+class Question(AtomicSaveMixin, models.Model):
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     title = models.CharField(max_length=255)
     text = models.TextField()
     tags = models.ManyToManyField(Tag, related_name="questions")
     created_at = models.DateTimeField(auto_now_add=True)
 
+    # денормализованные счётчики, см. app/signals.py и recount_counters
+    likes_count = models.PositiveIntegerField(default=0)
+    answers_count = models.PositiveIntegerField(default=0)
+    hot_score = models.FloatField(default=0)
+    # растёт при любом изменении карточки (текст, теги, лайки, ответы),
+    # входит в ключ кэша фрагментов (app/templatetags/fragments.py)
+    version = models.PositiveIntegerField(default=1)
+    # последний выданный Answer.position; удаление ответа сдвигает
+    # следующие номера и уменьшает его (close_answer_gap)
+    answers_seq = models.PositiveIntegerField(default=0)
+    # заголовок (вес A) и текст (вес B), заполняет триггер в PostgreSQL
+    search_vector = SearchVectorField(null=True, editable=False)
+
     objects = QuestionManager()
 
+    managed_fields = ("likes_count", "answers_count", "hot_score", "version", "answers_seq", "search_vector")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["-hot_score", "-id"], name="question_hot_idx"),
+            models.Index(fields=["-created_at", "-id"], name="question_new_idx"),
+            GinIndex(fields=["search_vector"], name="question_search_idx"),
+        ]
+
     def get_absolute_url(self):
         return reverse("question_detail", args=[self.pk])
 
@@ -81,46 +191,49 @@ class Question(models.Model):
         return (
             self.answers
                 .select_related("author", "author__profile")
-                .prefetch_related("likes")
-                .order_by("created_at")
+                .order_by("position")
         )
 
     def add_answer(self, *, author: User, form):
-        answer = form.save(commit=False)
-        answer.author = author
-        answer.question = self
-        answer.save()
-        return answer
+        return form.save(author=author, question=self)
 
     def url_to_answer(self, answer, request, per_page=5):
-        pos = self.get_answers_queryset().filter(pk__lte=answer.pk).count()
-        page = ceil(pos / per_page)
+        # position сплошной (1..n) и задаёт порядок страниц ответов
+        page = (answer.position - 1) // per_page + 1
         return f"{self.get_absolute_url()}?page={page}#answer{answer.pk}"
 
-    @property
-    def likes_count(self):
-        return self.likes.count()
-
-    @property
-    def answers_count(self):
-        return self.answers.count()
-
     def __str__(self):
         return self.title
 
 
-class Answer(models.Model):
+class Answer(AtomicSaveMixin, models.Model):
     question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name="answers")
     author = models.ForeignKey(User, on_delete=models.CASCADE)
     text = models.TextField()
     is_correct = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
+    likes_count = models.PositiveIntegerField(default=0)
+    version = models.PositiveIntegerField(default=1)
+    # порядковый номер ответа в вопросе (1, 2, ...), задаётся при вставке,
+    # после удаления ответа следующие сдвигаются (app/signals.py)
+    position = models.PositiveIntegerField(default=0)
+
+    managed_fields = ("likes_count", "version", "position")
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["question", "position"],
+                name="answer_question_position_uniq",
+                deferrable=models.Deferrable.DEFERRED,
+            ),
+        ]
 
     def __str__(self):
         return f"Answer #{self.pk}"
 
 
-class QuestionLike(models.Model):
+class QuestionLike(AtomicSaveMixin, models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     question = models.ForeignKey(Question, on_delete=models.CASCADE, related_name="likes")
 
@@ -128,7 +241,7 @@ class QuestionLike(models.Model):
         unique_together = ("user", "question")
 
 
-class AnswerLike(models.Model):
+class AnswerLike(AtomicSaveMixin, models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE)
     answer = models.ForeignKey(Answer, on_delete=models.CASCADE, related_name="likes")
 
@@ -138,7 +251,10 @@ class AnswerLike(models.Model):
 
 class Profile(models.Model):
     user = models.OneToOneField(User, on_delete=models.CASCADE)
-    avatar = models.ImageField(upload_to="avatars/", null=True, blank=True)
+    avatar = models.ImageField(upload_to="avatars/", storage=avatar_storage, null=True, blank=True)
+    # имя файла аватара, для которого готовы миниатюры (app/thumbnails.py);
+    # пока оно не совпадает с avatar.name, шаблоны показывают оригинал
+    thumbnails_for = models.CharField(max_length=100, blank=True, editable=False)
 
     def __str__(self):
         return f"Profile of {self.user.username}"
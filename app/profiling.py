@@ -0,0 +1,142 @@
+import os
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core import signing
+
+# Семплирующий профилировщик запросов: отдельный поток раз в PROFILE_INTERVAL
+# секунд снимает стеки через sys._current_frames() и считает одинаковые.
+# Результат — collapsed stacks ("a;b;c 12"), которые понимают flamegraph.pl,
+# speedscope и inferno; их объединяет команда merge_profiles.
+#
+# Снимаются поток запроса и потоки, запущенные из него за время запроса:
+# под WSGI асинхронное представление выполняется в цикле событий во
+# вспомогательном потоке (async_to_sync запускает его на каждый вызов), а ORM
+# (sync_to_async) — в потоке запроса. threading не хранит, кто запустил поток, поэтому
+# track_thread_parents() запоминает это в Thread.start; параллельные запросы
+# (runserver, ThreadingMixIn запускают поток на запрос) и фоновые потоки
+# (сброс лайков, миниатюры) в профиль не попадают. Исключение — общие пулы
+# (sync_to_async(thread_sensitive=False)): их потоки приписаны запросу, который
+# их запустил. Под ASGI цикл событий и потоки ORM общие для всех запросов,
+# поэтому ProfilingMiddleware там отключается.
+
+SALT = "app.profiling"
+
+# стек, у которого самый вложенный кадр в этих модулях, — поток простаивает
+# (ждёт очередь, select цикла событий, Condition), а не работает на запрос
+IDLE_MODULES = frozenset({
+    "threading", "selectors", "queue",
+    "concurrent.futures._base", "concurrent.futures.thread",
+    "asgiref.current_thread_executor",
+})
+
+
+def make_token():
+    return signing.TimestampSigner(salt=SALT).sign(secrets.token_hex(4))
+
+
+def valid_token(value):
+    max_age = getattr(settings, "PROFILE_TOKEN_MAX_AGE", 3600)
+    try:
+        signing.TimestampSigner(salt=SALT).unsign(value, max_age=max_age)
+    except signing.BadSignature:
+        return False
+    return True
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f"{frame.f_globals.get('__name__', '?')}.{code.co_qualname}"
+
+
+def collapse(frame):
+    if frame.f_globals.get("__name__") in IDLE_MODULES:
+        return None
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    # collapsed-формат: от корня к листу, кадры через ";"
+    return ";".join(reversed(names)).replace(" ", "_")
+
+
+_start = threading.Thread.start
+
+
+def _tracked_start(self, *args, **kwargs):
+    self._started_by = threading.get_ident()
+    self._started_at = time.monotonic()
+    return _start(self, *args, **kwargs)
+
+
+def track_thread_parents():
+    # идемпотентно; вызывает ProfilingMiddleware при запуске
+    threading.Thread.start = _tracked_start
+
+
+class StackSampler:
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self.target = threading.get_ident()
+        self.started = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler", daemon=True)
+
+    def _owned(self, ident, threads):
+        # поток запроса или его потомок, запущенный за время запроса: поток,
+        # который запрос запустил раньше (сброс лайков), и поток с занятым
+        # повторно идентификатором давно завершённого потока не учитываются
+        for _ in range(len(threads) + 1):
+            if ident == self.target:
+                return True
+            thread = threads.get(ident)
+            if getattr(thread, "_started_at", 0) < self.started:
+                return False
+            ident = thread._started_by
+        return False
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            threads = {t.ident: t for t in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me or not self._owned(ident, threads):
+                    continue
+                stack = collapse(frame)
+                if stack:
+                    self.stacks[stack] += 1
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+
+
+def save_profile(url_name, stacks):
+    # PROFILE_DIR/<url_name>/<время>-<pid>-<случайное>.collapsed
+    directory = os.path.join(settings.PROFILE_DIR, url_name or "unresolved")
+    os.makedirs(directory, exist_ok=True)
+    name = f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}-{secrets.token_hex(3)}.collapsed"
+    path = os.path.join(directory, name)
+    with open(path, "w", encoding="utf-8") as f:
+        for stack, count in stacks.most_common():
+            f.write(f"{stack} {count}\n")
+    return path
+
+
+def read_collapsed(path, into=None):
+    stacks = into if into is not None else Counter()
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            stack, _, count = line.rstrip("\n").rpartition(" ")
+            if stack and count.isdigit():
+                stacks[stack] += int(count)
+    return stacks
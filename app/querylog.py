@@ -0,0 +1,89 @@
+import re
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import lru_cache
+
+from django.db.backends.signals import connection_created
+
+# Учёт SQL без DEBUG=True: обёртка execute добавляется к каждому соединению
+# (connection_created) и пишет в recorder'ы из контекста текущего запроса.
+# ContextVar переходит и в потоки sync_to_async, поэтому async-представления
+# тоже учитываются.
+# Recorder'ы вкладываются (middleware внутри бенчмарка) — запрос пишется во все.
+_recorders = ContextVar("query_recorders", default=())
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r"(?<![\w.])-?\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%s|\$\d+|\?")
+_LIST = re.compile(r"\(\s*\?(?:\s*,\s*\?)*\s*\)")
+_ROWS = re.compile(r"\(\.\.\.\)(?:\s*,\s*\(\.\.\.\))+")
+_SPACE = re.compile(r"\s+")
+
+
+@lru_cache(maxsize=4096)
+def fingerprint(sql):
+    """
+    Форма запроса без значений: литералы и параметры -> ?, списки IN (...)
+    и многострочные VALUES сворачиваются, пробелы нормализуются.
+    Запросы, отличающиеся только значениями, получают одну форму.
+    ORM повторяет один и тот же текст с %s — результат кэшируется.
+    """
+    sql = _STRING.sub("?", sql)
+    sql = _NUMBER.sub("?", sql)
+    sql = _PLACEHOLDER.sub("?", sql)
+    sql = _LIST.sub("(...)", sql)
+    sql = _ROWS.sub("(...)", sql)
+    return _SPACE.sub(" ", sql).strip()
+
+
+class QueryRecorder:
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.shapes = Counter()
+
+    def record(self, alias, sql, duration):
+        self.count += 1
+        self.duration += duration
+        self.shapes[fingerprint(sql)] += 1
+
+    def repeated(self, threshold):
+        # одна и та же форма много раз за запрос — обычно N+1
+        return [(shape, n) for shape, n in self.shapes.most_common() if n >= threshold]
+
+
+@contextmanager
+def record_queries():
+    recorder = QueryRecorder()
+    token = _recorders.set(_recorders.get() + (recorder,))
+    try:
+        yield recorder
+    finally:
+        _recorders.reset(token)
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    recorders = _recorders.get()
+    if not recorders:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        for recorder in recorders:
+            recorder.record(context["connection"].alias, sql, duration)
+
+
+def _install(sender, connection, **kwargs):
+    # DatabaseWrapper живёт дольше соединения (пул, переподключение) —
+    # обёртка добавляется один раз. В начало списка: connection.execute_wrapper()
+    # снимает свои обёртки через pop() с конца
+    if _execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _execute_wrapper)
+
+
+def install():
+    connection_created.connect(_install, dispatch_uid="app.querylog")
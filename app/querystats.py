@@ -0,0 +1,186 @@
+import atexit
+import logging
+import os
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.backends.signals import connection_created
+
+from .checks import shared_cache
+from .querylog import fingerprint
+
+logger = logging.getLogger(__name__)
+
+# Статистика SQL по формам запросов для production (без DEBUG): обёртка
+# execute копит в памяти процесса число выполнений, суммарное и максимальное
+# время и строки на форму, поток раз в QUERY_STATS_FLUSH_INTERVAL секунд
+# дописывает накопленное в общий кэш (CACHES, см. app/checks.py). Ключи свои у каждого процесса (никто не пишет
+# в чужой) и разбиты на окна по QUERY_STATS_BUCKET секунд — top_queries
+# складывает окна всех процессов за нужный период.
+#
+#   querystats:workers              -> {процесс: время последнего сброса}
+#   querystats:<процесс>:<окно>     -> {форма: [count, total, max, rows]}
+
+OTHER = "<прочие формы>"
+WORKERS_KEY = "querystats:workers"
+
+_stats = {}
+_lock = threading.Lock()
+_flusher = None
+
+
+def _setting(name, default):
+    return getattr(settings, name, default)
+
+
+def enabled():
+    return _setting("QUERY_STATS", False)
+
+
+def worker_id():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def bucket_key(worker, bucket):
+    return f"querystats:{worker}:{bucket}"
+
+
+def current_bucket(now=None):
+    return int((now or time.time()) // _setting("QUERY_STATS_BUCKET", 300))
+
+
+def merge(into, shape, count, total, longest, rows):
+    entry = into.get(shape)
+    if entry is None:
+        into[shape] = [count, total, longest, rows]
+    else:
+        entry[0] += count
+        entry[1] += total
+        entry[2] = max(entry[2], longest)
+        entry[3] += rows
+
+
+def record(sql, duration, rows):
+    shape = fingerprint(sql)
+    with _lock:
+        # число форм ограничено: запросы с переменным текстом (сырые IN
+        # без параметров и т.п.) не должны раздувать память процесса
+        if shape not in _stats and len(_stats) >= _setting("QUERY_STATS_MAX_SHAPES", 500):
+            shape = OTHER
+        merge(_stats, shape, 1, duration, duration, max(rows, 0))
+    _ensure_flusher()
+
+
+def _execute_wrapper(execute, sql, params, many, context):
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        duration = time.perf_counter() - started
+        cursor = context.get("cursor")
+        record(sql, duration, getattr(cursor, "rowcount", -1) or 0)
+
+
+def _register(worker, retention):
+    # реестр процессов общий; потерянная при гонке запись восстановится на
+    # следующем сбросе этого процесса — и без новых запросов, иначе его
+    # окна за прошлые минуты пропали бы из top_queries
+    now = time.time()
+    workers = cache.get(WORKERS_KEY) or {}
+    workers[worker] = now
+    cache.set(WORKERS_KEY, {w: seen for w, seen in workers.items() if seen >= now - retention}, retention)
+
+
+def flush_stats():
+    global _stats
+    with _lock:
+        batch, _stats = _stats, {}
+
+    worker = worker_id()
+    retention = _setting("QUERY_STATS_RETENTION", 24 * 3600)
+    if batch:
+        key = bucket_key(worker, current_bucket())
+        try:
+            stored = cache.get(key) or {}
+            for shape, values in batch.items():
+                merge(stored, shape, *values)
+            cache.set(key, stored, retention)
+        except Exception:
+            # окно не записано — вернуть накопленное до следующей попытки
+            with _lock:
+                for shape, values in batch.items():
+                    merge(_stats, shape, *values)
+            raise
+    _register(worker, retention)
+    return len(batch)
+
+
+def shared_store():
+    # top_queries — отдельный процесс: из памяти воркеров он ничего не прочтёт
+    return shared_cache()
+
+
+def collect(minutes):
+    # -> ({форма: [count, total, max, rows]}, число процессов с данными)
+    now = time.time()
+    first, last = current_bucket(now - minutes * 60), current_bucket(now)
+    workers = cache.get(WORKERS_KEY) or {}
+    keys = [
+        bucket_key(worker, bucket)
+        for worker, seen in workers.items() if seen >= now - minutes * 60 - _setting("QUERY_STATS_BUCKET", 300)
+        for bucket in range(first, last + 1)
+    ]
+    totals, reporting = {}, set()
+    for key, stored in cache.get_many(keys).items():
+        reporting.add(key.rsplit(":", 1)[0])
+        for shape, values in stored.items():
+            merge(totals, shape, *values)
+    return totals, len(reporting)
+
+
+def _flush_loop(interval):
+    while True:
+        time.sleep(interval)
+        try:
+            flush_stats()
+        except Exception:
+            logger.exception("Не удалось сбросить статистику SQL")
+
+
+def _ensure_flusher():
+    global _flusher
+    if _flusher is not None and _flusher.is_alive():
+        return
+    with _lock:
+        # после fork (gunicorn --preload) поток родителя в дочернем процессе не работает
+        if _flusher is not None and _flusher.is_alive():
+            return
+        _flusher = threading.Thread(
+            target=_flush_loop,
+            args=(_setting("QUERY_STATS_FLUSH_INTERVAL", 10),),
+            name="querystats-flush",
+            daemon=True,
+        )
+        _flusher.start()
+
+
+@atexit.register
+def _flush_at_exit():
+    try:
+        flush_stats()
+    except Exception:
+        logger.exception("Не удалось сбросить статистику SQL при завершении")
+
+
+def _install(sender, connection, **kwargs):
+    # как в app/querylog.py: один раз на DatabaseWrapper, в начало списка
+    if _execute_wrapper not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, _execute_wrapper)
+
+
+def install():
+    if enabled():
+        connection_created.connect(_install, dispatch_uid="app.querystats")
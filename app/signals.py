@@ -0,0 +1,164 @@
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete, m2m_changed
+from django.dispatch import receiver
+
+from .models import Question, Answer, QuestionLike, AnswerLike, Profile, Tag, hot_score_expression
+from .conditional import SITE, touch
+from .counters import bump, bump_question, bump_tags, touch_versions
+from .microcache import purge_pages
+from .thumbnails import schedule_thumbnails
+
+
+# ---------------------- счётчики лайков/ответов ----------------------
+# save() моделей обёрнут в atomic (AtomicSaveMixin), удаление Django и так
+# выполняет в транзакции — счётчики (app/counters.py) меняются вместе со строкой.
+
+def _refresh(instance, *fields):
+    # UPDATE счётчика не трогает экземпляр: без перечитывания он рендерился бы
+    # со старой version — под уже занятым ключом кэша фрагментов
+    if instance is not None:
+        try:
+            instance.refresh_from_db(using=instance._state.db, fields=fields)
+        except instance.DoesNotExist:  # удаляется вместе с объектом (каскад)
+            pass
+
+
+def _cached_question(answer):
+    return answer.question if Answer.question.is_cached(answer) else None
+
+
+@receiver(post_save, sender=Question)
+def question_saved(sender, instance, created, **kwargs):
+    if created:
+        Question.objects.filter(pk=instance.pk).update(hot_score=hot_score_expression())
+        _refresh(instance, "hot_score")
+    else:
+        touch_versions(Question, [instance.pk])
+        _refresh(instance, "version")
+    purge_pages(instance.pk, site=created)
+
+
+def _tags_of(question_id):
+    return Tag.objects.filter(pk__in=Question.tags.through.objects.filter(question_id=question_id).values("tag_id"))
+
+
+def _count_tag_links(instance, action, reverse, pk_set):
+    # AskForm.save вставляет связи bulk_create мимо сигналов и считает сам.
+    # Удаляемые связи считаются до DELETE: в pk_set у *_remove — запрошенные
+    # id, среди них могут быть и несвязанные; у post_add — только новые
+    links = Question.tags.through.objects
+    if action == "post_add" and pk_set:
+        if reverse:
+            bump_tags(Tag.objects.filter(pk=instance.pk), len(pk_set))
+        else:
+            bump_tags(Tag.objects.filter(pk__in=pk_set), 1)
+    elif action == "pre_remove" and pk_set:
+        if reverse:
+            removed = links.filter(tag_id=instance.pk, question_id__in=pk_set).count()
+            bump_tags(Tag.objects.filter(pk=instance.pk), -removed)
+        else:
+            bump_tags(_tags_of(instance.pk).filter(pk__in=pk_set), -1)
+    elif action == "pre_clear":
+        if reverse:
+            bump_tags(Tag.objects.filter(pk=instance.pk), -links.filter(tag_id=instance.pk).count())
+        else:
+            bump_tags(_tags_of(instance.pk), -1)
+
+
+@receiver(pre_delete, sender=Question)
+def question_deleting(sender, instance, **kwargs):
+    # связи с тегами удаляются каскадом, без m2m_changed
+    bump_tags(_tags_of(instance.pk), -1)
+
+
+@receiver(post_delete, sender=Question)
+def question_deleted(sender, instance, **kwargs):
+    purge_pages(instance.pk, site=True)
+
+
+@receiver(m2m_changed, sender=Question.tags.through)
+def question_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    _count_tag_links(instance, action, reverse, pk_set)
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    if not reverse:
+        touch_versions(Question, [instance.pk])
+        _refresh(instance, "version")
+        purge_pages(instance.pk, site=True)
+    elif pk_set:
+        touch_versions(Question, pk_set)
+        for pk in pk_set:
+            purge_pages(pk, site=True)
+
+
+@receiver(post_save, sender=QuestionLike)
+def question_like_saved(sender, instance, created, **kwargs):
+    if created:
+        bump_question(instance.question_id, "likes_count", 1)
+
+
+@receiver(post_delete, sender=QuestionLike)
+def question_like_deleted(sender, instance, **kwargs):
+    bump_question(instance.question_id, "likes_count", -1)
+
+
+@receiver(post_save, sender=AnswerLike)
+def answer_like_saved(sender, instance, created, **kwargs):
+    if created:
+        bump(Answer, instance.answer_id, "likes_count", 1)
+
+
+@receiver(post_delete, sender=AnswerLike)
+def answer_like_deleted(sender, instance, **kwargs):
+    bump(Answer, instance.answer_id, "likes_count", -1)
+
+
+@receiver(pre_save, sender=Answer)
+def answer_position(sender, instance, **kwargs):
+    # выполняется внутри atomic из AtomicSaveMixin.save
+    if instance._state.adding and not instance.position:
+        instance.position = Question.objects.next_answer_position(instance.question_id)
+
+
+@receiver(post_save, sender=Answer)
+def answer_saved(sender, instance, created, **kwargs):
+    if created:
+        bump_question(instance.question_id, "answers_count", 1)
+        _refresh(_cached_question(instance), "answers_count", "answers_seq", "hot_score", "version")
+    else:
+        touch_versions(Answer, [instance.pk])
+        _refresh(instance, "version")
+    purge_pages(instance.question_id)
+
+
+@receiver(pre_delete, sender=Answer)
+def answer_deleting(sender, instance, **kwargs):
+    # удаление Django уже в транзакции — блокировка держится до её конца
+    instance.position = Question.objects.lock_answer_position(instance.question_id, instance.pk)
+
+
+@receiver(post_delete, sender=Answer)
+def answer_deleted(sender, instance, **kwargs):
+    if instance.position is not None:
+        Question.objects.close_answer_gap(instance.question_id, instance.position)
+    bump_question(instance.question_id, "answers_count", -1)
+    _refresh(_cached_question(instance), "answers_count", "answers_seq", "hot_score", "version")
+    purge_pages(instance.question_id)
+
+
+# ---------------------- миниатюры аватаров ----------------------
+
+@receiver(post_save, sender=User)
+def user_saved(sender, instance, created, update_fields, **kwargs):
+    # логин автора виден в карточках и ответах; вход (last_login) — не изменение
+    if not created and set(update_fields or ()) != {"last_login"}:
+        transaction.on_commit(lambda: touch(SITE))
+
+
+@receiver(post_save, sender=Profile)
+def profile_saved(sender, instance, **kwargs):
+    name = instance.avatar.name if instance.avatar else ""
+    transaction.on_commit(lambda: touch(SITE))
+    if name and name != instance.thumbnails_for:
+        transaction.on_commit(lambda: schedule_thumbnails(name))
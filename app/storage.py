@@ -0,0 +1,124 @@
+import gzip
+import hashlib
+import os
+import posixpath
+
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.files.storage import FileSystemStorage
+
+try:
+    import brotli
+except ImportError:  # без пакета brotli пишутся только .gz
+    brotli = None
+
+# расширения, которые имеет смысл сжимать; jpeg/png/woff2 уже сжаты
+COMPRESS_EXTENSIONS = (".css", ".js", ".mjs", ".map", ".svg", ".json", ".txt", ".xml", ".html", ".ico", ".ttf")
+# вариант сохраняется, только если он заметно меньше оригинала
+COMPRESS_MIN_RATIO = 0.95
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, в котором имя файла — sha256 его содержимого:
+    avatars/photo.JPG -> avatars/3f/3fa2…c9.jpg. Одинаковые загрузки
+    ссылаются на один файл, повторное сохранение ничего не пишет.
+    Файлы без ссылок удаляет команда gc_avatars.
+    """
+
+    def __init__(self, **kwargs):
+        # одинаковое имя означает одинаковое содержимое — перезапись безопасна
+        kwargs.setdefault("allow_overwrite", True)
+        super().__init__(**kwargs)
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        for chunk in content.chunks():
+            digest.update(chunk)
+        if hasattr(content, "seek"):
+            content.seek(0)
+        digest = digest.hexdigest()
+        dirname = posixpath.dirname(name)
+        ext = os.path.splitext(name)[1].lower()
+        return posixpath.join(dirname, digest[:2], f"{digest}{ext}")
+
+    def is_hashed(self, name):
+        # avatars/3f/3fa2…c9.jpg
+        dirname, filename = posixpath.split(name)
+        digest = os.path.splitext(filename)[0]
+        return (
+            len(digest) == 64
+            and posixpath.basename(dirname) == digest[:2]
+            and all(c in "0123456789abcdef" for c in digest)
+        )
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # gc_avatars --min-age судит по mtime: свежая ссылка на старый файл
+            # может быть ещё не закоммичена, и файл не должен выглядеть старым
+            try:
+                os.utime(self.path(name))
+            except FileNotFoundError:  # удалён между exists и utime
+                return super()._save(name, content)
+            return name
+        return super()._save(name, content)
+
+    def save_derived(self, name, content):
+        # производные файлы (миниатюры) пишутся под заданным именем, без хеширования
+        return super()._save(name, content)
+
+
+def avatar_storage():
+    # callable, чтобы миграции не зависели от MEDIA_ROOT
+    return ContentAddressedStorage()
+
+
+def _compressors():
+    yield ".gz", lambda data: gzip.compress(data, compresslevel=9, mtime=0)
+    if brotli is not None:
+        yield ".br", lambda data: brotli.compress(data, quality=11)
+
+
+class CompressedManifestStaticFilesStorage(ManifestStaticFilesStorage):
+    """
+    collectstatic: файлы получают хеш содержимого в имени (css/bootstrap.min.1a2b….css)
+    и заранее сжатые варианты рядом — .gz и, если установлен brotli, .br.
+    Отдаёт их StaticFilesMiddleware с заголовком immutable.
+    """
+
+    keep_intermediate_files = False
+    # source map-файлы не поставляются (bootstrap.min.css ссылается на
+    # отсутствующий .map) — ссылки на них не переписываются
+    patterns = tuple(
+        (ext, tuple(p for p in ext_patterns if "sourceMappingURL" not in str(p)))
+        for ext, ext_patterns in ManifestStaticFilesStorage.patterns
+    )
+
+    def post_process(self, paths, dry_run=False, **options):
+        names = set(paths)
+        for name, hashed_name, processed in super().post_process(paths, dry_run, **options):
+            if hashed_name and not isinstance(processed, Exception):
+                names.add(hashed_name)
+            yield name, hashed_name, processed
+        if dry_run:
+            return
+        for name in sorted(names):
+            for variant in self.compress(name):
+                yield name, variant, True
+
+    def compress(self, name):
+        if not name.lower().endswith(COMPRESS_EXTENSIONS):
+            return []
+        with self.open(name) as f:
+            data = f.read()
+        written = []
+        for suffix, compress in _compressors():
+            compressed = compress(data)
+            target = name + suffix
+            if self.exists(target):
+                self.delete(target)
+            if len(compressed) < len(data) * COMPRESS_MIN_RATIO:
+                with open(self.path(target), "wb") as f:
+                    f.write(compressed)
+                written.append(target)
+        return written
@@ -0,0 +1,61 @@
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .db import replica_reads
+from .models import Tag
+
+POPULAR_TAGS_KEY = "popular_tags"
+
+# кэш в памяти процесса: (момент устаревания, список тегов)
+_local = {"expires": 0.0, "tags": None}
+
+
+def _popular_tags_queryset():
+    limit = getattr(settings, "POPULAR_TAGS_LIMIT", 10)
+    return (
+        Tag.objects
+            .filter(questions_count__gt=0)
+            .order_by("-questions_count", "id")[:limit]
+    )
+
+
+def get_popular_tags():
+    now = time.monotonic()
+    if _local["tags"] is not None and _local["expires"] > now:
+        return _local["tags"]
+
+    tags = cache.get(POPULAR_TAGS_KEY)
+    if tags is None:
+        with replica_reads():
+            tags = list(_popular_tags_queryset())
+        cache.set(POPULAR_TAGS_KEY, tags, getattr(settings, "POPULAR_TAGS_TTL", 60))
+
+    _local["tags"] = tags
+    _local["expires"] = now + getattr(settings, "POPULAR_TAGS_LOCAL_TTL", 5)
+    return tags
+
+
+async def aget_popular_tags():
+    # для async-представлений: результат кладётся в контекст шаблона явно,
+    # ленивый объект из context_processors в event loop обращаться к базе не может
+    now = time.monotonic()
+    if _local["tags"] is not None and _local["expires"] > now:
+        return _local["tags"]
+
+    tags = await cache.aget(POPULAR_TAGS_KEY)
+    if tags is None:
+        with replica_reads():
+            tags = [tag async for tag in _popular_tags_queryset()]
+        await cache.aset(POPULAR_TAGS_KEY, tags, getattr(settings, "POPULAR_TAGS_TTL", 60))
+
+    _local["tags"] = tags
+    _local["expires"] = now + getattr(settings, "POPULAR_TAGS_LOCAL_TTL", 5)
+    return tags
+
+
+def invalidate_popular_tags():
+    # другие процессы увидят изменения по истечении POPULAR_TAGS_LOCAL_TTL
+    cache.delete(POPULAR_TAGS_KEY)
+    _local["tags"] = None
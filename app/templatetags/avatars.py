@@ -0,0 +1,43 @@
+from django import template
+from django.utils.html import format_html, format_html_join
+
+from app.thumbnails import thumbnail_formats, thumbnail_name, thumbnail_sizes
+
+register = template.Library()
+
+
+@register.simple_tag
+def avatar(profile, size=96, style=""):
+    """
+    {% avatar profile 96 style="..." %}
+
+    Миниатюра аватара (<picture> с WebP и JPEG, 1x/2x), а пока миниатюры
+    не построены — оригинальный файл.
+    """
+    if not profile or not profile.avatar:
+        return ""
+    name = profile.avatar.name
+    storage = profile.avatar.storage
+    sizes = thumbnail_sizes()
+
+    if profile.thumbnails_for != name or size not in sizes:
+        return format_html(
+            '<img src="{}" alt="avatar" width="{}" height="{}" style="{}">',
+            profile.avatar.url, size, size, style,
+        )
+
+    def srcset(fmt):
+        candidates = [(size, "1x"), (size * 2, "2x")]
+        return ", ".join(
+            f"{storage.url(thumbnail_name(name, s, fmt))} {d}" for s, d in candidates if s in sizes
+        )
+
+    sources = format_html_join(
+        "", '<source type="image/{}" srcset="{}">',
+        ((fmt, srcset(fmt)) for fmt in thumbnail_formats() if fmt != "jpeg"),
+    )
+    return format_html(
+        '<picture>{}<img src="{}" srcset="{}" alt="avatar" width="{}" height="{}" style="{}"></picture>',
+        sources,
+        storage.url(thumbnail_name(name, size, "jpeg")), srcset("jpeg"), size, size, style,
+    )
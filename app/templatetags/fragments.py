@@ -0,0 +1,90 @@
+from collections import Counter
+from hashlib import md5
+
+from django import template
+from django.conf import settings
+from django.core.cache import cache
+
+register = template.Library()
+
+STATS_KEYS = {"hit": "fragments:hits", "miss": "fragments:misses"}
+
+# счётчики попаданий копятся в процессе и сбрасываются в общий кэш пачками,
+# чтобы не делать лишний запрос к кэшу на каждый фрагмент
+_pending = Counter()
+
+
+def _record(outcome):
+    _pending[outcome] += 1
+    if sum(_pending.values()) >= getattr(settings, "FRAGMENT_CACHE_STATS_FLUSH", 100):
+        flush_stats()
+
+
+def flush_stats():
+    for outcome, count in list(_pending.items()):
+        key = STATS_KEYS[outcome]
+        if not cache.add(key, count, None):
+            try:
+                cache.incr(key, count)
+            except ValueError:  # ключ вытеснен между add и incr
+                cache.set(key, count, None)
+    _pending.clear()
+
+
+def get_stats():
+    flush_stats()
+    return {outcome: cache.get(key, 0) for outcome, key in STATS_KEYS.items()}
+
+
+def reset_stats():
+    _pending.clear()
+    cache.delete_many(list(STATS_KEYS.values()))
+
+
+def fragment_key(name, obj, vary_on):
+    # version объекта меняется при каждой правке — старые ключи просто
+    # перестают запрашиваться и вытесняются кэшем
+    vary = md5(":".join(str(v) for v in vary_on).encode(), usedforsecurity=False).hexdigest()
+    return f"fragment:{name}:{obj.pk}:{obj.version}:{vary}"
+
+
+class FragmentNode(template.Node):
+    def __init__(self, nodelist, name, obj, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.obj = obj
+        self.vary_on = vary_on
+
+    def render(self, context):
+        name = self.name.resolve(context)
+        obj = self.obj.resolve(context)
+        key = fragment_key(name, obj, [v.resolve(context) for v in self.vary_on])
+        value = cache.get(key)
+        if value is None:
+            _record("miss")
+            value = self.nodelist.render(context)
+            cache.set(key, value, getattr(settings, "FRAGMENT_CACHE_TTL", 86400))
+        else:
+            _record("hit")
+        return value
+
+
+@register.tag
+def fragment(parser, token):
+    """
+    {% fragment "question_card" question [vary_on ...] %} ... {% endfragment %}
+
+    Кэширует содержимое под ключом из имени, pk и version объекта
+    и дополнительных значений vary_on (например, файла аватара автора).
+    """
+    bits = token.split_contents()
+    if len(bits) < 3:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires at least 2 arguments.")
+    nodelist = parser.parse(("endfragment",))
+    parser.delete_first_token()
+    return FragmentNode(
+        nodelist,
+        parser.compile_filter(bits[1]),
+        parser.compile_filter(bits[2]),
+        [parser.compile_filter(b) for b in bits[3:]],
+    )
@@ -0,0 +1,40 @@
+from django.conf import settings
+from django.urls import reverse
+
+from .querylog import record_queries
+
+
+class QueryBudgetMixin:
+    """
+    Примесь к django.test.TestCase: проверка бюджета SQL-запросов страницы.
+
+        class FeedTests(QueryBudgetMixin, TestCase):
+            def test_index(self):
+                self.assertQueryBudget("index")
+                self.assertQueryBudget("question_detail", args=[self.question.pk])
+
+    Бюджет берётся из settings.QUERY_BUDGETS по url_name (или аргумента budget).
+    Тест падает при превышении и при повторении одной формы запроса
+    QUERY_REPEAT_THRESHOLD и более раз — так N+1 ловится даже в пределах бюджета.
+    """
+
+    def assertQueryBudget(self, url_name, args=None, kwargs=None, data=None, budget=None, client=None):
+        if budget is None:
+            budget = getattr(settings, "QUERY_BUDGETS", {}).get(url_name)
+        if budget is None:
+            self.fail(f"Для {url_name} не задан бюджет в QUERY_BUDGETS")
+        client = client or self.client
+        url = reverse(url_name, args=args, kwargs=kwargs)
+
+        with record_queries() as recorder:
+            response = client.get(url, data)
+
+        self.assertLess(response.status_code, 400, f"{url}: статус {response.status_code}")
+        shapes = "\n".join(f"  {n} × {shape}" for shape, n in recorder.shapes.most_common())
+        if recorder.count > budget:
+            self.fail(f"{url}: {recorder.count} SQL-запросов при бюджете {budget}:\n{shapes}")
+        threshold = getattr(settings, "QUERY_REPEAT_THRESHOLD", 5)
+        repeated = recorder.repeated(threshold)
+        if repeated:
+            self.fail(f"{url}: запрос повторён {repeated[0][1]} раз (N+1?):\n{shapes}")
+        return response
@@ -0,0 +1,493 @@
+import io
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import warnings
+from collections import Counter
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.db.models import Count
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+
+from . import likes, profiling, querystats
+from .conditional import FEEDS, touch
+from .models import HOT_KEYS, NEW_KEYS, SEARCH_KEYS, Answer, Question, QuestionLike, Tag
+from .querylog import fingerprint
+from .tags import invalidate_popular_tags
+from .templatetags.avatars import avatar
+from .testing import QueryBudgetMixin
+from .thumbnails import thumbnail_formats, thumbnail_name
+from .utils import keyset_queryset, paginate
+
+LOCMEM_CACHES = {"default": {"BACKEND": "django.core.cache.backends.locmem.LocMemCache"}}
+# тесты идут с DEBUG=False, а манифест статики появляется только после collectstatic
+PLAIN_STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+
+@override_settings(CACHES=LOCMEM_CACHES, STORAGES=PLAIN_STORAGES, ALLOWED_HOSTS=["testserver"])
+class SeededTestCase(TestCase):
+    # данные fill_db в отдельном MEDIA_ROOT: аватар и миниатюры не попадают в media/
+    @classmethod
+    def setUpClass(cls):
+        cls.media_root = tempfile.mkdtemp()
+        cls.media_override = override_settings(MEDIA_ROOT=cls.media_root)
+        cls.media_override.enable()
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        cls.media_override.disable()
+        shutil.rmtree(cls.media_root, ignore_errors=True)
+
+    @classmethod
+    def setUpTestData(cls):
+        call_command("fill_db", 3, seed=1, stdout=io.StringIO())
+        cls.user = User.objects.order_by("pk").first()
+        cls.question = Question.objects.order_by("-answers_count", "pk").first()
+        cls.tag = Tag.objects.order_by("-questions_count").first()
+
+    def setUp(self):
+        # страницы не должны приходить из microcache/фрагментов прошлого теста,
+        # сайдбар тегов — из памяти процесса: бюджет проверяется на холодном кэше
+        cache.clear()
+        invalidate_popular_tags()
+
+
+class QueryBudgetTests(QueryBudgetMixin, SeededTestCase):
+    def assertPagesWithinBudget(self):
+        self.assertQueryBudget("index")
+        self.assertQueryBudget("hot")
+        self.assertQueryBudget("tag", args=[self.tag.name])
+        self.assertQueryBudget("question_detail", args=[self.question.pk])
+        self.assertQueryBudget("question_detail", args=[self.question.pk], data={"page": 2})
+
+    def test_anonymous(self):
+        self.assertPagesWithinBudget()
+
+    def test_authenticated(self):
+        self.client.force_login(self.user)
+        self.assertPagesWithinBudget()
+
+    def test_warm_fragment_cache(self):
+        self.client.force_login(self.user)
+        self.assertPagesWithinBudget()
+        self.assertPagesWithinBudget()
+
+
+class AnswerPermalinkTests(SeededTestCase):
+    def assertAnswerOnPage(self, answer):
+        with self.assertNumQueries(0):
+            url = self.question.url_to_answer(answer, None)
+        response = self.client.get(url.split("#")[0])
+        self.assertContains(response, f'id="answer{answer.pk}"')
+
+    def test_every_answer(self):
+        for answer in self.question.get_answers_queryset():
+            self.assertAnswerOnPage(answer)
+
+    def test_after_deleting_answers(self):
+        # удаление сдвигает номера следующих ответов: ответ №6 после удаления
+        # первых трёх становится третьим и оказывается на первой странице
+        answers = list(self.question.get_answers_queryset())
+        self.assertGreaterEqual(len(answers), 6)
+        for answer in answers[:3]:
+            answer.delete()
+        remaining = list(self.question.get_answers_queryset())
+        self.assertEqual([a.pk for a in remaining], [a.pk for a in answers[3:]])
+        self.assertEqual([a.position for a in remaining], list(range(1, len(remaining) + 1)))
+        self.question.refresh_from_db()
+        self.assertEqual(self.question.answers_seq, len(remaining))
+        self.assertIn("?page=1#", self.question.url_to_answer(remaining[2], None))
+        for answer in remaining:
+            cache.clear()
+            self.assertAnswerOnPage(answer)
+
+    def test_new_answer_after_delete(self):
+        answers = list(self.question.get_answers_queryset())
+        answers[0].delete()
+        answer = Answer.objects.create(question=self.question, author=self.user, text="Новый ответ")
+        self.assertEqual(answer.position, len(answers))
+        cache.clear()
+        self.assertAnswerOnPage(answer)
+
+
+def _walk(plan):
+    yield plan
+    for child in plan.get("Plans", []):
+        yield from _walk(child)
+
+
+class QueryPlanTests(SeededTestCase):
+    # на маленькой базе планировщик честно выбирает Seq Scan;
+    # с enable_seqscan=off он остаётся только там, где нет подходящего индекса
+    def setUp(self):
+        super().setUp()
+        with connection.cursor() as cursor:
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def deep_page(self, queryset, keys):
+        # курсор со второй страницы — запрос с условием keyset
+        rf = RequestFactory()
+        first = paginate(queryset, rf.get("/"), 5, keys=keys)
+        self.assertTrue(first.next_cursor)
+        qs, *_ = keyset_queryset(queryset, rf.get("/", {"cursor": first.next_cursor}), keys)
+        return qs[:6]
+
+    def assertNoSeqScan(self, queryset):
+        plan = json.loads(queryset.explain(format="json"))[0]["Plan"]
+        seq_scans = sorted({n["Relation Name"] for n in _walk(plan) if n["Node Type"] == "Seq Scan"})
+        self.assertEqual(seq_scans, [], json.dumps(plan, indent=2, ensure_ascii=False))
+
+    def test_feeds(self):
+        for name, queryset, keys in (
+            ("index", Question.objects.feed_new(), NEW_KEYS),
+            ("hot", Question.objects.feed_hot(), HOT_KEYS),
+            ("tag", Question.objects.feed_by_tag(self.tag.name), NEW_KEYS),
+            ("search", Question.objects.search(self.question.title.split()[0]), SEARCH_KEYS),
+        ):
+            with self.subTest(name):
+                self.assertNoSeqScan(queryset[:6])
+            with self.subTest(f"{name}, следующая страница"):
+                self.assertNoSeqScan(self.deep_page(queryset, keys))
+
+    def test_question_page(self):
+        page_ids = list(Question.objects.feed_new().values_list("pk", flat=True)[:5])
+        for name, queryset in (
+            ("теги карточек (prefetch)", Question.tags.through.objects.filter(question_id__in=page_ids)),
+            ("question_detail", Question.objects.detail().filter(pk=self.question.pk)),
+            ("ответы, страница 2", self.question.get_answers_queryset()[5:10]),
+            ("популярные теги", Tag.objects.filter(questions_count__gt=0).order_by("-questions_count", "id")[:10]),
+        ):
+            with self.subTest(name):
+                self.assertNoSeqScan(queryset)
+
+    def test_form_lookups(self):
+        user = self.user
+        for name, queryset in (
+            ("signup: username__iexact", User.objects.filter(username__iexact=user.username.upper())),
+            ("signup: email", User.objects.filter(email=user.email)),
+            ("profile_edit: email", User.objects.filter(email=user.email).exclude(pk=user.pk)),
+        ):
+            with self.subTest(name):
+                self.assertNoSeqScan(queryset)
+
+
+class ConditionalGetTests(SeededTestCase):
+    def test_no_validators_right_after_write(self):
+        # сайдбар и microcache ещё могут отдать старое тело — ETag на него не выдаётся
+        touch(FEEDS)
+        response = self.client.get("/")
+        self.assertFalse(response.has_header("ETag"))
+        self.assertFalse(response.has_header("Last-Modified"))
+
+    def test_not_modified_once_settled(self):
+        with override_settings(CONDITIONAL_SETTLE_SECONDS=0):
+            etag = self.client.get("/")["ETag"]
+            self.assertEqual(self.client.get("/", HTTP_IF_NONE_MATCH=etag).status_code, 304)
+            touch(FEEDS)
+            self.assertEqual(self.client.get("/", HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+
+class AvatarTagTests(SeededTestCase):
+    def test_picture_with_thumbnails(self):
+        profile = self.user.profile
+        self.assertEqual(profile.thumbnails_for, profile.avatar.name)
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            html = avatar(profile, 96)
+        self.assertTrue(html.startswith("<picture>"))
+        self.assertEqual(html.count("<source "), len(thumbnail_formats()) - 1)
+        self.assertIn(thumbnail_name(profile.avatar.name, 192, "jpeg"), html)
+
+
+class TagCounterTests(SeededTestCase):
+    def assertCountsMatchLinks(self):
+        actual = dict(Tag.objects.annotate(n=Count("questions")).values_list("pk", "n"))
+        self.assertEqual(dict(Tag.objects.values_list("pk", "questions_count")), actual)
+
+    def test_remove_add_clear(self):
+        self.assertCountsMatchLinks()
+        tags = list(self.question.tags.all())
+        unrelated = Tag.objects.exclude(questions=self.question).first()
+        self.question.tags.remove(tags[0], unrelated)
+        self.assertCountsMatchLinks()
+        self.question.tags.add(tags[0], unrelated)
+        self.assertCountsMatchLinks()
+        self.question.tags.clear()
+        self.assertCountsMatchLinks()
+
+    def test_reverse_side(self):
+        questions = list(self.tag.questions.all()[:2])
+        self.tag.questions.remove(*questions, Question.objects.exclude(tags=self.tag).first())
+        self.assertCountsMatchLinks()
+        self.tag.questions.add(*questions)
+        self.assertCountsMatchLinks()
+        self.tag.questions.clear()
+        self.assertCountsMatchLinks()
+
+    def test_delete_question(self):
+        self.question.delete()
+        self.assertCountsMatchLinks()
+
+
+class LikeTests(SeededTestCase):
+    def setUp(self):
+        super().setUp()
+        likes._pending.clear()
+        self.addCleanup(likes._pending.clear)
+        # сбрасывает сам тест: поток сброса работал бы через своё соединение
+        patcher = mock.patch.object(likes, "_ensure_flusher")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.client.force_login(self.user)
+        QuestionLike.objects.filter(user=self.user, question=self.question).delete()
+        self.question.refresh_from_db()
+
+    def like(self, name, pk):
+        # в TestCase on_commit откладывается до конца теста — выполняем явно
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            response = self.client.post(reverse(name, args=[pk]))
+        return response, callbacks
+
+    def test_like_unlike_idempotent(self):
+        start = self.question.likes_count
+        response, callbacks = self.like("question_like", self.question.pk)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(callbacks), 1)  # INSERT ... RETURNING вернул строку
+        self.assertEqual(likes.likes_count("question", self.question.pk), start + 1)
+
+        response, callbacks = self.like("question_like", self.question.pk)
+        self.assertEqual(response.json()["likes_count"], start + 1)
+        self.assertEqual(callbacks, [])  # ON CONFLICT DO NOTHING: строки нет
+
+        self.like("question_unlike", self.question.pk)
+        response, callbacks = self.like("question_unlike", self.question.pk)
+        self.assertEqual(callbacks, [])  # DELETE ... RETURNING: лайка уже нет
+        self.assertEqual(response.json()["likes_count"], start)
+        self.assertFalse(QuestionLike.objects.filter(user=self.user, question=self.question).exists())
+
+    def test_anonymous_and_missing(self):
+        self.client.logout()
+        self.assertEqual(self.client.post(reverse("question_like", args=[self.question.pk])).status_code, 401)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.post(reverse("answer_like", args=[10**9])).status_code, 404)
+
+    def test_target_deleted_before_insert(self):
+        # FK в PostgreSQL отложен до коммита; в тесте коммита нет — проверяем сразу
+        with connection.cursor() as cursor:
+            cursor.execute("SET CONSTRAINTS ALL IMMEDIATE")
+        with self.assertRaises(Question.DoesNotExist):
+            likes.set_like("question", 10**9, self.user, True)
+
+    def test_flush_updates_counters_and_purges_pages(self):
+        self.client.logout()
+        self.assertEqual(self.client.get("/")["X-Microcache"], "MISS")
+        self.assertEqual(self.client.get("/")["X-Microcache"], "HIT")
+
+        answer = self.question.answers.first()
+        user = User.objects.exclude(pk=self.user.pk).exclude(answerlike__answer=answer).first()
+        with self.captureOnCommitCallbacks(execute=True):
+            likes.set_like("question", self.question.pk, self.user, True)
+            likes.set_like("answer", answer.pk, user, True)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(likes.flush_likes(), 2)
+        self.assertEqual(likes._pending, {})
+
+        question_likes, version = Question.objects.values_list("likes_count", "version").get(pk=self.question.pk)
+        self.assertEqual(question_likes, self.question.likes_count + 1)
+        self.assertGreater(version, self.question.version)
+        self.assertEqual(Answer.objects.get(pk=answer.pk).likes_count, answer.likes_count + 1)
+        # анонимы не получают страницу со старым счётчиком из microcache
+        self.assertEqual(self.client.get("/")["X-Microcache"], "MISS")
+
+
+class SearchTests(SeededTestCase):
+    @classmethod
+    def setUpTestData(cls):
+        super().setUpTestData()
+        # слово в заголовке (вес A) весит больше, чем в тексте (вес B)
+        cls.in_title = [
+            Question.objects.create(author=cls.user, title=f"Шумят ли вувузелы на трибунах №{i}", text="Обсуждение шума")
+            for i in range(4)
+        ]
+        cls.in_text = [
+            Question.objects.create(author=cls.user, title=f"Вопрос о болельщиках №{i}", text="Запретят ли на стадионе вувузелу?")
+            for i in range(4)
+        ]
+
+    def search(self, **params):
+        return paginate(Question.objects.search("вувузела"), RequestFactory().get("/search/", params), 5, keys=SEARCH_KEYS)
+
+    def test_match_and_rank(self):
+        # русская морфология: "вувузела" находит и "вувузелы", и "вувузелу"
+        found = list(Question.objects.search("вувузела"))
+        self.assertEqual({q.pk for q in found}, {q.pk for q in self.in_title + self.in_text})
+        self.assertEqual({q.pk for q in found[:4]}, {q.pk for q in self.in_title})
+        self.assertEqual([q.rank for q in found], sorted((q.rank for q in found), reverse=True))
+
+    def test_keyset_second_page(self):
+        first = self.search()
+        self.assertEqual(len(first.object_list), 5)
+        second = self.search(cursor=first.next_cursor)
+        self.assertFalse(second.has_next)
+        pages = [q.pk for q in first.object_list] + [q.pk for q in second.object_list]
+        self.assertEqual(pages, [q.pk for q in Question.objects.search("вувузела")])
+
+    def test_view(self):
+        response = self.client.get(reverse("search"), {"q": "вувузела"})
+        self.assertContains(response, self.in_title[0].title)
+
+
+class FillDbTests(SeededTestCase):
+    def test_rerun_with_same_seed(self):
+        # данные SeededTestCase созданы с seed=1 — повтор без clear_db
+        users = User.objects.count()
+        call_command("fill_db", 1, seed=1, stdout=io.StringIO())
+        self.assertEqual(User.objects.count(), users + 1)
+
+
+def _busy(stop):
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def _busy_request_child(stop):
+    _busy(stop)
+
+
+def _busy_other_request(stop):
+    _busy(stop)
+
+
+class ProfilingTests(SimpleTestCase):
+    def test_token(self):
+        token = profiling.make_token()
+        self.assertTrue(profiling.valid_token(token))
+        self.assertFalse(profiling.valid_token(token + "x"))
+        self.assertFalse(profiling.valid_token("garbage"))
+        with override_settings(PROFILE_TOKEN_MAX_AGE=-1):
+            self.assertFalse(profiling.valid_token(token))
+
+    def test_collapse(self):
+        stack = profiling.collapse(sys._getframe())
+        self.assertTrue(stack.endswith(";app.tests.ProfilingTests.test_collapse"))
+        self.assertNotIn(" ", stack)
+        # самый вложенный кадр в модуле ожидания — поток простаивает
+        idle = {"__name__": "queue"}
+        exec("import sys\nframe = sys._getframe()", idle)
+        self.assertIsNone(profiling.collapse(idle["frame"]))
+
+    def test_sampler_takes_only_threads_of_the_request(self):
+        profiling.track_thread_parents()
+        stop, go = threading.Event(), threading.Event()
+        self.addCleanup(stop.set)
+
+        def other_request():
+            # параллельный запрос: его поток запущен не из этого запроса
+            go.wait()
+            threading.Thread(target=_busy_other_request, args=(stop,)).start()
+
+        threading.Thread(target=other_request).start()
+        with profiling.StackSampler(0.001) as sampler:
+            go.set()
+            child = threading.Thread(target=_busy_request_child, args=(stop,))
+            child.start()
+            time.sleep(0.2)
+        stop.set()
+        child.join()
+        stacks = "\n".join(sampler.stacks)
+        self.assertIn("app.tests._busy_request_child", stacks)
+        self.assertNotIn("app.tests._busy_other_request", stacks)
+
+    def test_merge_profiles(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root, ignore_errors=True)
+        with override_settings(PROFILE_DIR=root):
+            profiling.save_profile("index", Counter({"a;b": 3, "a;c": 1}))
+            profiling.save_profile("index", Counter({"a;b": 2}))
+            profiling.save_profile("hot", Counter({"x;y": 5}))
+            call_command("merge_profiles", speedscope=True, stdout=io.StringIO())
+        merged = os.path.join(root, "merged")
+        self.assertEqual(profiling.read_collapsed(os.path.join(merged, "index.collapsed")), {"a;b": 5, "a;c": 1})
+        self.assertEqual(
+            profiling.read_collapsed(os.path.join(merged, "all.collapsed")),
+            {"index;a;b": 5, "index;a;c": 1, "hot;x;y": 5},
+        )
+        with open(os.path.join(merged, "hot.speedscope.json"), encoding="utf-8") as f:
+            self.assertEqual(json.load(f)["profiles"][0]["samples"], [[0, 1]])
+
+
+@override_settings(CACHES=LOCMEM_CACHES, QUERY_STATS_MAX_SHAPES=3)
+class QueryStatsTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        querystats._stats = {}
+        self.addCleanup(setattr, querystats, "_stats", {})
+        patcher = mock.patch.object(querystats, "_ensure_flusher")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_fingerprint(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id IN (1, 2, 3) AND name = 'x''y'  AND n > %s"),
+            "SELECT * FROM t WHERE id IN (...) AND name = ? AND n > ?",
+        )
+        self.assertEqual(fingerprint("INSERT INTO t VALUES (%s, %s), (%s, %s)"), "INSERT INTO t VALUES (...)")
+
+    def test_record_limits_shapes(self):
+        for i in range(5):
+            querystats.record(f"SELECT {i} FROM t{i}", 0.5, 2)
+        querystats.record("SELECT 9 FROM t0", 1.5, 1)
+        self.assertEqual(len(querystats._stats), 4)
+        self.assertEqual(querystats._stats["SELECT ? FROM t0"], [2, 2.0, 1.5, 3])
+        self.assertEqual(querystats._stats[querystats.OTHER][0], 2)
+
+    def test_flush_and_collect(self):
+        querystats.record("SELECT 1 FROM t", 0.25, 1)
+        self.assertEqual(querystats.flush_stats(), 1)
+        querystats.record("SELECT 2 FROM t", 0.5, 1)
+        querystats.flush_stats()
+        totals, workers = querystats.collect(5)
+        self.assertEqual(workers, 1)
+        self.assertEqual(totals, {"SELECT ? FROM t": [2, 0.75, 0.5, 2]})
+
+    def test_registry_failure_does_not_double_count(self):
+        querystats.record("SELECT 1 FROM t", 0.25, 1)
+        set_ = cache.set
+
+        def failing_set(key, *args, **kwargs):
+            if key == querystats.WORKERS_KEY:
+                raise ConnectionError
+            return set_(key, *args, **kwargs)
+
+        with mock.patch.object(cache, "set", failing_set), self.assertRaises(ConnectionError):
+            querystats.flush_stats()
+        self.assertEqual(querystats._stats, {})  # окно записано — не возвращаем
+        querystats.flush_stats()
+        self.assertEqual(querystats.collect(5)[0]["SELECT ? FROM t"][0], 1)
+
+    def test_bucket_failure_keeps_batch(self):
+        querystats.record("SELECT 1 FROM t", 0.25, 1)
+        with mock.patch.object(cache, "set", side_effect=ConnectionError), self.assertRaises(ConnectionError):
+            querystats.flush_stats()
+        self.assertEqual(querystats._stats["SELECT ? FROM t"][0], 1)
+
+    def test_idle_worker_reregisters(self):
+        querystats.record("SELECT 1 FROM t", 0.25, 1)
+        querystats.flush_stats()
+        cache.delete(querystats.WORKERS_KEY)  # запись потеряна при гонке
+        self.assertEqual(querystats.flush_stats(), 0)
+        self.assertEqual(querystats.collect(5)[1], 1)
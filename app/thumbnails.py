@@ -0,0 +1,83 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import close_old_connections
+from PIL import Image, ImageOps, features
+
+from .conditional import SITE, touch
+from .models import Profile
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+
+
+def thumbnail_sizes():
+    return getattr(settings, "AVATAR_THUMBNAIL_SIZES", (96, 192))
+
+
+def thumbnail_formats():
+    return ("webp", "jpeg") if features.check("webp") else ("jpeg",)
+
+
+def thumbnail_name(name, size, fmt):
+    # avatars/foo.jpeg -> avatars/foo.96.webp, рядом с оригиналом
+    root, _ = os.path.splitext(name)
+    return f"{root}.{size}.{fmt}"
+
+
+def thumbnail_names(name):
+    return [thumbnail_name(name, size, fmt) for size in thumbnail_sizes() for fmt in thumbnail_formats()]
+
+
+def generate_thumbnails(name, force=False):
+    storage = Profile._meta.get_field("avatar").storage
+    # файл общий для всех, кто загрузил те же байты, — миниатюры строятся один раз
+    if force or not all(storage.exists(target) for target in thumbnail_names(name)):
+        _render_thumbnails(storage, name)
+
+    # отмечаем все профили с этим файлом (в том числе общий аватар из fill_db)
+    if Profile.objects.filter(avatar=name).update(thumbnails_for=name):
+        touch(SITE)  # карточки переходят с оригинала на миниатюры
+
+
+def _render_thumbnails(storage, name):
+    with storage.open(name, "rb") as f:
+        image = ImageOps.exif_transpose(Image.open(f))
+        image.load()
+    if image.mode not in ("RGB", "RGBA"):
+        image = image.convert("RGBA" if "transparency" in image.info else "RGB")
+
+    for size in thumbnail_sizes():
+        thumb = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+        for fmt in thumbnail_formats():
+            buffer = BytesIO()
+            if fmt == "jpeg":
+                thumb.convert("RGB").save(buffer, "JPEG", quality=85, optimize=True, progressive=True)
+            else:
+                thumb.save(buffer, "WEBP", quality=80, method=4)
+            storage.save_derived(thumbnail_name(name, size, fmt), ContentFile(buffer.getvalue()))
+
+
+def _run(name):
+    try:
+        generate_thumbnails(name)
+    except Exception:
+        logger.exception("Не удалось построить миниатюры для %s", name)
+    finally:
+        close_old_connections()
+
+
+def schedule_thumbnails(name):
+    # вызывается из transaction.on_commit — файл и профиль уже сохранены
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(
+            max_workers=getattr(settings, "AVATAR_THUMBNAIL_WORKERS", 2),
+            thread_name_prefix="thumbnails",
+        )
+    _executor.submit(_run, name)
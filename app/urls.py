@@ -6,6 +6,13 @@ urlpatterns = [
     path("hot/", views.hot, name="hot"),
     path("tag/<str:tag_name>/", views.tag, name="tag"),
     path("question/<int:question_id>/", views.question_detail, name="question_detail"),
+    path("search/", views.search, name="search"),
+
+    # лайки (AJAX, POST)
+    path("question/<int:pk>/like/", views.like_view, {"kind": "question", "liked": True}, name="question_like"),
+    path("question/<int:pk>/unlike/", views.like_view, {"kind": "question", "liked": False}, name="question_unlike"),
+    path("answer/<int:pk>/like/", views.like_view, {"kind": "answer", "liked": True}, name="answer_like"),
+    path("answer/<int:pk>/unlike/", views.like_view, {"kind": "answer", "liked": False}, name="answer_unlike"),
 
     # формы авторизации/регистрации
     path("login/", views.login_view, name="login"),
@@ -15,4 +22,7 @@ urlpatterns = [
     # добавление вопроса и редактирование профиля
     path("ask/", views.ask_view, name="ask"),
     path("profile/edit/", views.profile_edit_view, name="settings"),
+
+    # мониторинг
+    path("metrics/db-pool/", views.db_pool_metrics, name="db_pool_metrics"),
 ]
\ No newline at end of file
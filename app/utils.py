@@ -1,7 +1,35 @@
+from django.core import signing
+from django.core.exceptions import FieldDoesNotExist
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.db.models import Q
 
-def paginate(objects_list, request, per_page=10):
+CURSOR_SALT = "app.utils.paginate"
+
+
+def paginate(objects_list, request, per_page=10, keys=None, count=None):
+    if keys is not None:
+        return paginate_keyset(objects_list, request, per_page, keys)
+    paginator = Paginator(objects_list, per_page)
+    if count is not None:
+        paginator.count = count  # известное число строк (счётчик) — без COUNT(*)
+    page_number = request.GET.get('page', 1)
+    try:
+        page = paginator.page(page_number)
+    except PageNotAnInteger:
+        page = paginator.page(1)
+    except EmptyPage:
+        page = paginator.page(paginator.num_pages)
+    return page
+
+
+async def apaginate(objects_list, request, per_page=10, keys=None, count=None):
+    # то же, что paginate, для async-представлений: все запросы идут через
+    # async ORM, object_list страницы — уже загруженный список, и шаблон
+    # не обращается к базе из event loop
+    if keys is not None:
+        return await apaginate_keyset(objects_list, request, per_page, keys)
     paginator = Paginator(objects_list, per_page)
+    paginator.count = count if count is not None else await objects_list.acount()
     page_number = request.GET.get('page', 1)
     try:
         page = paginator.page(page_number)
@@ -9,4 +37,115 @@ def paginate(objects_list, request, per_page=10):
         page = paginator.page(1)
     except EmptyPage:
         page = paginator.page(paginator.num_pages)
+    page.object_list = [obj async for obj in page.object_list]
     return page
+
+
+# ----------------------- keyset-пагинация -----------------------
+# Страница выбирается условием по ключу сортировки последней/первой строки
+# (WHERE (created_at, id) < (...) LIMIT n+1) вместо COUNT(*) и OFFSET,
+# поэтому стоимость не зависит от глубины. Курсор — подписанный токен
+# с направлением и значениями ключей, в шаблоне он непрозрачен.
+
+class KeysetPage:
+    is_keyset = True
+
+    def __init__(self, object_list, has_next, has_previous, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.has_next = has_next
+        self.has_previous = has_previous
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def has_other_pages(self):
+        return self.has_next or self.has_previous
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+
+def _key_field(model, key):
+    try:
+        return model._meta.get_field(key)
+    except FieldDoesNotExist:
+        return None  # аннотация (например, ранг поиска)
+
+
+def _encode_cursor(direction, obj, names, fields):
+    values = []
+    for name, field in zip(names, fields):
+        value = getattr(obj, name)
+        values.append(field.value_to_string(obj) if field is not None else value)
+    return signing.dumps({"d": direction, "v": values}, salt=CURSOR_SALT, compress=True)
+
+
+def _decode_cursor(token, fields):
+    try:
+        data = signing.loads(token, salt=CURSOR_SALT)
+        direction, raw = data["d"], data["v"]
+        if direction not in ("n", "p") or len(raw) != len(fields):
+            return None
+        values = [f.to_python(v) if f is not None else v for f, v in zip(fields, raw)]
+    except (signing.BadSignature, KeyError, TypeError, ValueError):
+        return None
+    return direction, values
+
+
+def _after(names, descending, values, reverse):
+    # лексикографическое "строго после" по ключам в порядке выдачи
+    condition = Q()
+    for i, name in enumerate(names):
+        lookup = "lt" if descending[i] != reverse else "gt"
+        prefix = {names[j]: values[j] for j in range(i)}
+        condition |= Q(**prefix, **{f"{name}__{lookup}": values[i]})
+    return condition
+
+
+def _build_keyset_page(rows, per_page, direction, has_cursor, names, fields):
+    has_more = len(rows) > per_page
+    rows = rows[:per_page]
+    if direction == "p":
+        rows.reverse()
+        has_next, has_previous = True, has_more
+    else:
+        has_next, has_previous = has_more, has_cursor
+    next_cursor = previous_cursor = None
+    if rows and has_next:
+        next_cursor = _encode_cursor("n", rows[-1], names, fields)
+    if rows and has_previous:
+        previous_cursor = _encode_cursor("p", rows[0], names, fields)
+    return KeysetPage(rows, has_next, has_previous, next_cursor, previous_cursor)
+
+
+def keyset_queryset(queryset, request, keys):
+    names = [k.lstrip("-") for k in keys]
+    descending = [k.startswith("-") for k in keys]
+    fields = [_key_field(queryset.model, n) for n in names]
+
+    cursor = request.GET.get("cursor")
+    decoded = _decode_cursor(cursor, fields) if cursor else None
+    direction, values = decoded if decoded else ("n", None)
+
+    if values is None:
+        queryset = queryset.order_by(*keys)
+    elif direction == "n":
+        queryset = queryset.filter(_after(names, descending, values, False)).order_by(*keys)
+    else:
+        inverted = [n if d else f"-{n}" for n, d in zip(names, descending)]
+        queryset = queryset.filter(_after(names, descending, values, True)).order_by(*inverted)
+    return queryset, direction, values is not None, names, fields
+
+
+def paginate_keyset(queryset, request, per_page, keys):
+    queryset, direction, has_cursor, names, fields = keyset_queryset(queryset, request, keys)
+    rows = list(queryset[:per_page + 1])
+    return _build_keyset_page(rows, per_page, direction, has_cursor, names, fields)
+
+
+async def apaginate_keyset(queryset, request, per_page, keys):
+    queryset, direction, has_cursor, names, fields = keyset_queryset(queryset, request, keys)
+    rows = [obj async for obj in queryset[:per_page + 1]]
+    return _build_keyset_page(rows, per_page, direction, has_cursor, names, fields)
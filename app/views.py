@@ -1,33 +1,78 @@
-from django.http import Http404
-from django.views.decorators.http import require_http_methods, require_safe
+import asyncio
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.exceptions import ObjectDoesNotExist, PermissionDenied
+from django.http import Http404, JsonResponse
+from django.views.decorators.http import require_POST, require_http_methods, require_safe
 from django.contrib.auth import login, logout
 from django.contrib.auth.decorators import login_required
-from django.shortcuts import render, redirect, get_object_or_404
+from django.shortcuts import render, redirect, aget_object_or_404
 from django.urls import reverse
 from django.utils.http import url_has_allowed_host_and_scheme
 
-from .models import Question, Tag
+from .models import Question, Tag, NEW_KEYS, HOT_KEYS, SEARCH_KEYS
+from .conditional import conditional_page, feed_etag, feed_last_modified, question_etag, question_last_modified
+from .db import pool_stats
 from .forms import LoginForm, SignupForm, AskForm, AnswerForm, ProfileEditForm
-from .utils import paginate
+from .likes import LIKE_TARGETS, set_like
+from .microcache import microcache
+from .tags import aget_popular_tags
+from .utils import apaginate, paginate
 
 SAFE_REDIRECT = "index"
 
+async def _gather(request, *aws):
+    # запросы страницы, сайдбара и пользователя выполняются конкурентно;
+    # request.user загружается заранее — шаблон рендерится в event loop
+    # и не должен обращаться к базе через ленивые объекты
+    user, *results = await asyncio.gather(request.auser(), *aws)
+    request.user = user
+    return results
+
 @require_safe
-def index(request):
-    page = paginate(Question.objects.feed_new(), request, 5)
-    return render(request, "index.html", {"page_obj": page})
+@conditional_page(feed_etag, feed_last_modified)
+@microcache("feeds")
+async def index(request):
+    page, tags = await _gather(
+        request,
+        apaginate(Question.objects.feed_new(), request, 5, keys=NEW_KEYS),
+        aget_popular_tags(),
+    )
+    return render(request, "index.html", {"page_obj": page, "popular_tags": tags})
 
 @require_safe
-def hot(request):
-    page = paginate(Question.objects.feed_hot(), request, 5)
-    return render(request, "hot.html", {"page_obj": page})
+@conditional_page(feed_etag, feed_last_modified)
+@microcache("feeds")
+async def hot(request):
+    page, tags = await _gather(
+        request,
+        apaginate(Question.objects.feed_hot(), request, 5, keys=HOT_KEYS),
+        aget_popular_tags(),
+    )
+    return render(request, "hot.html", {"page_obj": page, "popular_tags": tags})
 
 @require_safe
-def tag(request, tag_name):
-    if not Tag.objects.filter(name=tag_name).exists():
+@conditional_page(feed_etag, feed_last_modified)
+@microcache("feeds")
+async def tag(request, tag_name):
+    exists, page, tags = await _gather(
+        request,
+        Tag.objects.filter(name=tag_name).aexists(),
+        apaginate(Question.objects.feed_by_tag(tag_name), request, 5, keys=NEW_KEYS),
+        aget_popular_tags(),
+    )
+    if not exists:
         raise Http404
-    page = paginate(Question.objects.feed_by_tag(tag_name), request, 5)
-    return render(request, "tag.html", {"page_obj": page, "tag_name": tag_name})
+    return render(request, "tag.html", {"page_obj": page, "tag_name": tag_name, "popular_tags": tags})
+
+@require_safe
+def search(request):
+    query = request.GET.get("q", "").strip()[:200]
+    page = None
+    if query:
+        page = paginate(Question.objects.search(query), request, 5, keys=SEARCH_KEYS)
+    return render(request, "search.html", {"page_obj": page, "query": query})
 
 @require_http_methods(["GET", "POST"])
 def login_view(request):
@@ -77,23 +122,44 @@ def ask_view(request):
     return render(request, "ask.html", {"form": form})
 
 @require_http_methods(["GET", "POST"])
-def question_detail(request, question_id):
-    question = get_object_or_404(Question.objects.full(), pk=question_id)
-    page = paginate(question.get_answers_queryset(), request, 5)
+@conditional_page(question_etag, question_last_modified)
+@microcache("question:{question_id}")
+async def question_detail(request, question_id):
+    question = await aget_object_or_404(Question.objects.detail(), pk=question_id)
 
     form = AnswerForm(request.POST or None)
-    if request.method == "POST" and form.is_valid():
-        if not request.user.is_authenticated:
+    if request.method == "POST" and await sync_to_async(form.is_valid)():
+        user = await request.auser()
+        if not user.is_authenticated:
             return redirect(f"{reverse('login')}?continue={request.path}")
-        answer = question.add_answer(author=request.user, form=form)
+        # запись идёт в транзакции (AtomicSaveMixin) — в синхронном потоке
+        answer = await sync_to_async(question.add_answer)(author=user, form=form)
         return redirect(question.url_to_answer(answer, request))
 
+    page, tags = await _gather(
+        request,
+        apaginate(question.get_answers_queryset(), request, 5, count=question.answers_count),
+        aget_popular_tags(),
+    )
     return render(
         request,
         "question.html",
-        {"question": question, "page_obj": page, "answer_form": form},
+        {"question": question, "page_obj": page, "answer_form": form, "popular_tags": tags},
     )
 
+@require_POST
+def like_view(request, kind, pk, liked):
+    # AJAX-кнопки +/−; сессия могла истечь — 401, клиент уводит на вход
+    if not request.user.is_authenticated:
+        return JsonResponse({"login": reverse("login")}, status=401)
+    if not LIKE_TARGETS[kind][2].objects.filter(pk=pk).exists():
+        raise Http404
+    try:
+        count = set_like(kind, pk, request.user, liked)
+    except ObjectDoesNotExist:  # удалён после проверки выше
+        raise Http404
+    return JsonResponse({"id": pk, "liked": liked, "likes_count": count})
+
 @login_required(login_url="/login/")
 @require_http_methods(["GET", "POST"])
 def profile_edit_view(request):
@@ -107,3 +173,17 @@ def profile_edit_view(request):
         form.save()
         return redirect(request.path)
     return render(request, "profile_edit.html", {"form": form})
+
+def _check_monitoring(request):
+    # staff-пользователь или мониторинг с токеном MONITORING_TOKEN
+    token = getattr(settings, "MONITORING_TOKEN", "")
+    if token and request.headers.get("Authorization") == f"Bearer {token}":
+        return
+    if not (request.user.is_authenticated and request.user.is_staff):
+        raise PermissionDenied
+
+@require_safe
+def db_pool_metrics(request):
+    # счётчики конкретного процесса: опрашивайте каждый воркер
+    _check_monitoring(request)
+    return JsonResponse({"pools": pool_stats()})